@@ -26,9 +26,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import random
 import threading
+import time
 import os.path as path
 
 from nnRecorder import logger
+from nnMonitor import monitor, profile, tracememory, nostage
 import nnManager
 
 # CODE VARS
@@ -39,6 +41,10 @@ CODE_MODIFY_BUTTON = 'button'
 CODE_WRITELOG      = 'writelog'
 CODE_SHOWRESULTS   = 'showresults'
 CODE_GRAPHS        = 'graphs'
+CODE_GRAPHS_DONE   = 'graphsdone'
+
+# Minimum time (seconds) between two progress updates sent to the GUI
+PROGRESS_INTERVAL  = 0.1
 
 class simargs(object):
     # Set some default values
@@ -62,6 +68,23 @@ class simargs(object):
     simargs['auctest']       = 0.800
     simargs['abundvar']      = False
     simargs['burnin']        = 25
+    simargs['interactions']  = False
+    simargs['logformat']     = 'text'
+    simargs['processes']     = 0
+    simargs['profile']       = False
+    simargs['trace_memory']  = False
+    simargs['trace']         = False
+    simargs['backend']       = 'auto'
+    simargs['batched']       = False
+    simargs['optimizer']     = 'sgd'
+    simargs['hintmode']      = 'grid'
+    simargs['warmstart']     = None
+    simargs['finetune']      = 0
+    simargs['append']        = False
+    simargs['adaptive']      = False
+    simargs['minreps']       = 5
+    simargs['tolerance']     = 0.005
+    simargs['patience']      = 3
 
     def __init__(self):
         pass
@@ -87,18 +110,28 @@ class connection(simargs):
         self.gui = False
         self.logger = logger('Simapse log')
         self.LOG = self.logger.log
+        self.monitor = monitor()
         self.queue = False
+        self.lastprogress = None
+        self.pendingprogress = None
 
     def _initiateLogFile(self):
         '''initiates a file handler for log after defining output folder'''
         self.logger.setLogFile(path.join(self.simargs['out_dir'], 'log.txt'))
 
+    def _put(self, code, args, kwargs):
+        '''Puts a message in the GUI queue, after any pending progress.'''
+        if self.pendingprogress is not None:
+            pending, self.pendingprogress = self.pendingprogress, None
+            self.queue.put_nowait([CODE_PROGRESS] + pending)
+        self.queue.put_nowait([code, args, kwargs])
+
     def display_msg(self, *args, **kwargs):
         ''' Displays a message.
             If GUI: Wraper for queue.put_nowait() but with code for message
             If CL: print message on terminal'''
         if self.gui:
-            self.queue.put_nowait([CODE_TEXT, args, kwargs])
+            self._put(CODE_TEXT, args, kwargs)
         else:
             print(args[0]) #TODO add a streamer to the logger
         self.LOG.info(args[0])
@@ -107,28 +140,54 @@ class connection(simargs):
         ''' Modifies buttons state in GUI
             Wraper for queue.put_nowait() but with code for modify button '''
         if self.gui:
-            self.queue.put_nowait([CODE_MODIFY_BUTTON, args, kwargs])
+            self._put(CODE_MODIFY_BUTTON, args, kwargs)
 
     def progress_bar(self, *args, **kwargs):
         ''' Modifies progress bar in GUI
-            Wraper for queue.put_nowait() but with code for update progress bar'''
+            Wraper for queue.put_nowait() but with code for update progress bar
+            Updates are coalesced: a new percentage is sent at most once
+            every PROGRESS_INTERVAL seconds, while new messages, colours, a
+            restart or the end of the progress are sent at once. Only the
+            latest skipped update is kept and it is sent before the next
+            message.'''
         if self.gui:
-            self.queue.put_nowait([CODE_PROGRESS, args, kwargs])
+            value, maxvalue = args[:2]
+            percent = (value * 100) / maxvalue if maxvalue else 100
+            now = time.time()
+            last = self.lastprogress
+            if last is None or kwargs != last[2] or value >= maxvalue or \
+               percent < last[0] or \
+               (percent <> last[0] and now - last[1] >= PROGRESS_INTERVAL):
+                self.lastprogress = [percent, now, kwargs]
+                self.pendingprogress = None
+                self.queue.put_nowait([CODE_PROGRESS, args, kwargs])
+            elif percent <> last[0]:
+                self.pendingprogress = [args, kwargs]
 
     def showResults(self, *args, **kwargs):
         ''' Wraper for queue.put_nowait() to show results'''
         if self.gui:
-            self.queue.put_nowait([CODE_SHOWRESULTS, args, kwargs])
+            self._put(CODE_SHOWRESULTS, args, kwargs)
         else:
             print('Check results in output folder')
 
     def processGraph(self, graph_object):
         "Process graphs. If in GUI mode, GUI thread processes."
         if self.gui:
-            self.queue.put_nowait([CODE_GRAPHS, graph_object, {}])
+            self._put(CODE_GRAPHS, graph_object, {})
         else:
             graph_object()
 
+    def processGraphs(self, graph_objects):
+        '''Renders independent graphs in a pool of processes (see
+           nnGraphs.rendergraphs) and returns the image files. In GUI mode,
+           the GUI thread is only notified with the finished images.'''
+        import nnGraphs
+        files = nnGraphs.rendergraphs(graph_objects, self.simargs['processes'])
+        if self.gui:
+            self._put(CODE_GRAPHS_DONE, files, {})
+        return files
+
     def put_message(self, msg):
         """ A wrapper to queue.put_nowait() """
         self.queue.put_nowait(msg)
@@ -150,10 +209,31 @@ class connection(simargs):
             self.wrap_processor(target, varsdic)
 
     def wrap_processor(self, target, varsdic):
-        ''' A wrapper for the manager.model '''
+        ''' A wrapper for the manager.model
+            The cost of each stage (wall and CPU time, peak memory and
+            counters) is written to the log and to timings.json in the
+            output folder. If 'profile' or 'trace_memory' are set, a
+            cProfile and a report of the top allocations of the stage are
+            also saved in the output folder. If 'trace' is set, the spans of
+            all stages run so far are saved in trace.json.'''
+        stage = target.__name__
+        out_dir = varsdic['out_dir']
+        if varsdic.get('trace'):
+            self.monitor.starttrace()
+        profiler = profile if varsdic.get('profile') else nostage
+        tracer = tracememory if varsdic.get('trace_memory') else nostage
         try:
-            target(**varsdic)
+            with self.monitor.stage(stage), profiler(out_dir, stage), \
+                 tracer(out_dir, stage):
+                target(**varsdic)
         except Exception,e:
             self.LOG.error(e)
             print 'error:', e
+        self.monitor.report(self.LOG.info, stage)
+        try:
+            self.monitor.save(out_dir)
+            if self.monitor.events is not None:
+                self.monitor.savetrace(out_dir)
+        except IOError, e:
+            self.LOG.error(e)
 
@@ -57,6 +57,58 @@ HELP_AUCFILTER   = "Logical value for filtering iterations with AUC " +\
                    "value. Default is 0, which means that AUC is not used."
 HELP_AUCTRAIN    = "AUC threshold for training results."
 HELP_AUCTEST     = "AUC thresholf for test results."
+HELP_INTERACT    = "Logical value for computing the two-way interaction " +\
+                   "surfaces of all pairs of variables. Default is 0."
+HELP_LOGFORMAT   = "Format of the results logs: 'text' (default) or " +\
+                   "'binary' (typed arrays in a single container per " +\
+                   "output folder)."
+HELP_EXPORT_TXT  = "Logical value for only exporting the binary results " +\
+                   "logs of the output folder to text files."
+HELP_PROCESSES   = "Number of processes to render the graphs (default " +\
+                   "0 uses all CPUs, 1 renders in the main process)."
+HELP_PROFILE     = "Logical value for saving a cProfile of each stage " +\
+                   "(profile_<stage>.prof) in the output folder."
+HELP_TRACE_MEM   = "Logical value for saving a report of the top memory " +\
+                   "allocations of each stage (memory_<stage>.txt) in " +\
+                   "the output folder."
+HELP_TRACE       = "Logical value for saving a timeline of the stages " +\
+                   "and of the phases of each repetition (trace.json, " +\
+                   "Chrome trace-event format) in the output folder."
+HELP_BACKEND     = "Compute backend: 'pure' (reference), other available " +\
+                   "backends (e.g. 'numpy') or 'auto' (default) to choose " +\
+                   "the fastest with a short calibration."
+HELP_BATCHED     = "Logical value for training all repetitions together " +\
+                   "as one stack of networks (vectorized with numpy). " +\
+                   "Default is 0: repetitions are trained one by one."
+HELP_OPTIMIZER   = "Training optimizer: 'sgd' (default, online training " +\
+                   "with learning rate and momentum), 'rprop' or 'adam' " +\
+                   "(full-batch, the learning rate is the initial step) " +\
+                   "or 'lbfgs' (full-batch quasi-Newton, no learning rate)."
+HELP_HINT        = "Only gives a learning rate hint: 'grid' trains the " +\
+                   "networks with 17 fixed learning rates, 'range' " +\
+                   "trains a single network with increasing learning " +\
+                   "rates (range test) and suggests the one with the " +\
+                   "steepest loss descent (always for the sgd optimizer)."
+HELP_WARMSTART   = "Output folder of a previous run or comma separated " +\
+                   ".net files used as initial weights of the " +\
+                   "repetitions (same network scheme, no burn in)."
+HELP_FINETUNE    = "Number of AUC reports when warm starting, to " +\
+                   "fine-tune with fewer iterations. Default is 0: " +\
+                   "same as iterreport."
+HELP_APPEND      = "Logical value for adding the repetitions to a " +\
+                   "finished run in the output folder, continuing its " +\
+                   "numbering, logs and running statistics. Default is " +\
+                   "0: the output folder is overwritten."
+HELP_ADAPTIVE    = "Logical value for stopping the repetitions when the " +\
+                   "average map and variable importance are stable " +\
+                   "(repetitions is then the maximum). Default is 0."
+HELP_MINREPS     = "Minimum number of repetitions of the adaptive " +\
+                   "ensemble size. Default is 5."
+HELP_TOLERANCE   = "Largest change of the averages by a new repetition " +\
+                   "considered stable in the adaptive ensemble size. " +\
+                   "Default is 0.005."
+HELP_PATIENCE    = "Consecutive stable repetitions needed to stop the " +\
+                   "adaptive ensemble size. Default is 3."
 HELP_PROJECT_DIR = "Directory with rasters to create a projection."
 HELP_ONLY_PROJ   = "Logical value for building models or only to " +\
                    "project already built models using a different " +\
@@ -71,53 +123,98 @@ CITATION        = "Please cite: Tarroso, P, Carvalho, S & Brito, " +\
                   "and Evolution, doi:10.1111/j.2041-210X.2012.00210.x" 
 
 
-startGUI = False
-
-parser = argparse.ArgumentParser(description=TITLE, epilog=CITATION)
-parser.add_argument("file_data", nargs='?',
-                    help=HELP_FILE_DATA)
-parser.add_argument("dir_rasters", nargs='?',
-                    help=HELP_DIR_RASTERS)
-parser.add_argument("out_dir", nargs='?',
-                    help=HELP_OUT_DIR)
-parser.add_argument("-s", "--method", type=int, choices=[1, 2, 3], 
-                    default=1, help=HELP_METHOD)
-parser.add_argument("-r", "--repetitions", type=int, default = 5,
-                    help=HELP_REPETITIONS)
-parser.add_argument("-bs", "--bsize", type=int, default = 100,
-                    help=HELP_BSIZE)
-parser.add_argument("-ir", "--iterreport", type=int, default = 250, 
-                    help=HELP_ITERREPORT)
-parser.add_argument("-ii", "--iterinter", type=int, default = 10, 
-                    help=HELP_ITERINTER)
-parser.add_argument("-b", "--burnin", type=int, default=25, 
-                    help=HELP_BURNIN)
-parser.add_argument("-lr", "--lrate", type=float, default = 0.1, 
-                    help=HELP_LRATE)
-parser.add_argument("-m", "--momentum", type=float, default = 0.1,
-                    help=HELP_MOMENTUM)
-parser.add_argument("-hl", "--hiddenlyrs", type=str, default = "3",
-                    help=HELP_HIDDENLYRS)
-parser.add_argument("-pa", "--apratio", type=float, default = 1,
-                    help=HELP_APRATIO)
-parser.add_argument("-tp", "--percentage", type=int, default = 25,
-                    help=HELP_PERCENTAGE)
-parser.add_argument("-af", "--aucfilter", type=bool, default=False,
-                    help=HELP_AUCFILTER)
-parser.add_argument("-atr", "--auctrain", type=float, default=0.800, 
-                    help=HELP_AUCTRAIN)
-parser.add_argument("-ate", "--auctest", type=float, default=0.800, 
-                    help=HELP_AUCTEST)
-parser.add_argument("-prj", "--project_dir", type=str, 
-                    help=HELP_PROJECT_DIR)
-parser.add_argument("-p", "--only_project", type=bool, default=False,
-                    help=HELP_ONLY_PROJ)
-args = parser.parse_args()
-
-if [args.file_data, args.dir_rasters, args.out_dir] == [None, None, None]:
-    startGUI = True
-
-def startCL(conn):
+def getparser():
+    '''Returns the command line parser.'''
+    import nnBackends
+    import nnOptimizers
+    parser = argparse.ArgumentParser(description=TITLE, epilog=CITATION)
+    parser.add_argument("file_data", nargs='?',
+                        help=HELP_FILE_DATA)
+    parser.add_argument("dir_rasters", nargs='?',
+                        help=HELP_DIR_RASTERS)
+    parser.add_argument("out_dir", nargs='?',
+                        help=HELP_OUT_DIR)
+    parser.add_argument("-s", "--method", type=int, choices=[1, 2, 3], 
+                        default=1, help=HELP_METHOD)
+    parser.add_argument("-r", "--repetitions", type=int, default = 5,
+                        help=HELP_REPETITIONS)
+    parser.add_argument("-bs", "--bsize", type=int, default = 100,
+                        help=HELP_BSIZE)
+    parser.add_argument("-ir", "--iterreport", type=int, default = 250, 
+                        help=HELP_ITERREPORT)
+    parser.add_argument("-ii", "--iterinter", type=int, default = 10, 
+                        help=HELP_ITERINTER)
+    parser.add_argument("-b", "--burnin", type=int, default=25, 
+                        help=HELP_BURNIN)
+    parser.add_argument("-lr", "--lrate", type=float, default = 0.1, 
+                        help=HELP_LRATE)
+    parser.add_argument("-m", "--momentum", type=float, default = 0.1,
+                        help=HELP_MOMENTUM)
+    parser.add_argument("-hl", "--hiddenlyrs", type=str, default = "3",
+                        help=HELP_HIDDENLYRS)
+    parser.add_argument("-pa", "--apratio", type=float, default = 1,
+                        help=HELP_APRATIO)
+    parser.add_argument("-tp", "--percentage", type=int, default = 25,
+                        help=HELP_PERCENTAGE)
+    parser.add_argument("-af", "--aucfilter", type=bool, default=False,
+                        help=HELP_AUCFILTER)
+    parser.add_argument("-atr", "--auctrain", type=float, default=0.800, 
+                        help=HELP_AUCTRAIN)
+    parser.add_argument("-ate", "--auctest", type=float, default=0.800, 
+                        help=HELP_AUCTEST)
+    parser.add_argument("-ia", "--interactions", type=int, default=0,
+                        choices=[0, 1], help=HELP_INTERACT)
+    parser.add_argument("-lf", "--logformat", type=str, default='text',
+                        choices=['text', 'binary'], help=HELP_LOGFORMAT)
+    parser.add_argument("-et", "--export_text", type=int, default=0,
+                        choices=[0, 1], help=HELP_EXPORT_TXT)
+    parser.add_argument("-np", "--processes", type=int, default=0,
+                        help=HELP_PROCESSES)
+    parser.add_argument("-pf", "--profile", type=int, default=0,
+                        choices=[0, 1], help=HELP_PROFILE)
+    parser.add_argument("-tm", "--trace_memory", type=int, default=0,
+                        choices=[0, 1], help=HELP_TRACE_MEM)
+    parser.add_argument("-tr", "--trace", type=int, default=0,
+                        choices=[0, 1], help=HELP_TRACE)
+    parser.add_argument("-be", "--backend", type=str, default='auto',
+                        choices=[nnBackends.AUTO] + nnBackends.names(),
+                        help=HELP_BACKEND)
+    parser.add_argument("-bt", "--batched", type=int, default=0,
+                        choices=[0, 1], help=HELP_BATCHED)
+    parser.add_argument("-op", "--optimizer", type=str, default='sgd',
+                        choices=nnOptimizers.names(), help=HELP_OPTIMIZER)
+    parser.add_argument("-ht", "--hint", type=str, default=None,
+                        choices=['grid', 'range'], help=HELP_HINT)
+    parser.add_argument("-ws", "--warmstart", type=str, default=None,
+                        help=HELP_WARMSTART)
+    parser.add_argument("-ft", "--finetune", type=int, default=0,
+                        help=HELP_FINETUNE)
+    parser.add_argument("-ap", "--append", type=int, default=0,
+                        choices=[0, 1], help=HELP_APPEND)
+    parser.add_argument("-ad", "--adaptive", type=int, default=0,
+                        choices=[0, 1], help=HELP_ADAPTIVE)
+    parser.add_argument("-mr", "--minreps", type=int, default=5,
+                        help=HELP_MINREPS)
+    parser.add_argument("-tl", "--tolerance", type=float, default=0.005,
+                        help=HELP_TOLERANCE)
+    parser.add_argument("-pt", "--patience", type=int, default=3,
+                        help=HELP_PATIENCE)
+    parser.add_argument("-prj", "--project_dir", type=str, 
+                        help=HELP_PROJECT_DIR)
+    parser.add_argument("-p", "--only_project", type=bool, default=False,
+                        help=HELP_ONLY_PROJ)
+    return parser
+
+def parseargs(argv=None):
+    '''Parses the command line arguments (sys.argv if argv is None).'''
+    return getparser().parse_args(argv)
+
+def startGUI(args):
+    '''True when no data, rasters or output folder is given.'''
+    paths = [args.file_data, args.dir_rasters, args.out_dir]
+    return paths == [None, None, None]
+
+def startCL(conn, args):
     if args.method == 1:
         args.method = "Random repetition"
     elif args.method == 2:
@@ -127,8 +224,17 @@ def startCL(conn):
 
     print(args.method)
     conn.simargs.update(args.__dict__)
+    if args.export_text:
+        conn.processor(conn.manager.export_text, 'export text')
+        return
+
     conn.processor(conn.manager.read_all, 'read rasters')
 
+    if args.hint:
+        conn.simargs['hintmode'] = args.hint
+        conn.processor(conn.manager.hint, 'hint')
+        return
+
     if not args.only_project:
         conn.processor(conn.manager.model, 'run model')
         conn.processor(conn.manager.results, 'creating results')
@@ -29,6 +29,8 @@ import Queue
 import threading
 import Connector
 
+GRAPHS_MSG = "%s graphs saved in the output folder"
+
 class EMNN():
     def __init__(self, conn):
         conn.gui = True
@@ -55,6 +57,7 @@ class EMNN():
         self.folds = 0
         self.func = ""
         self.aucfilter = IntVar()
+        self.rangehint = IntVar()
 
         self.lightgray = '#d9d9d9'
         self.darkgray  = '#d3d3d3'
@@ -469,6 +472,14 @@ class EMNN():
             self.entBurnin.delete(0, 'end')
             self.entBurnin.insert('end', c['burnin'])
 
+            self.chkRangeHint = Checkbutton(self.root)
+            self.chkRangeHint.place(in_=self.frameOptionSelection,x=160,y=28)
+            self.chkRangeHint.configure(font = self.normaltext,
+                                        text="Range test hint",
+                                        variable=self.rangehint,
+                                        bg = self.lightgray)
+            self.rangehint.set(int(c['hintmode'] == 'range'))
+
             self.chkAucFilter = Checkbutton(self.root)
             self.chkAucFilter.place(in_=self.frameOptionSelection,x=2,y=60)
             self.chkAucFilter.configure(font = self.normaltext,
@@ -532,6 +543,8 @@ class EMNN():
         c['repetitions']   = int(extract('entRepetitions', c['repetitions']))
         c['bsize']         = int(extract('entBsize', c['bsize']))
         c['aucfilter']     = bool(extract('aucfilter', int(c['aucfilter'])))
+        rangehint          = extract('rangehint', int(c['hintmode'] == 'range'))
+        c['hintmode']      = ['grid', 'range'][bool(rangehint)]
 
     def extract(self, test, default):
         if test in self.__dict__.keys():
@@ -590,26 +603,38 @@ class EMNN():
 
     def periodicUpdate(self):
         """Executes periodic checks to GUI:
-            - if there are new messages and displays when true"""
+            - if there are new messages and displays when true
+           Consecutive progress updates are merged and only the latest one
+           is drawn. The window is refreshed once per check."""
+        progress = None
         try:
             while 1:
                 code, args, kwargs = self.queue.get_nowait()
+                if code == Connector.CODE_PROGRESS:
+                    progress = [args, kwargs]
+                    self.queue.task_done()
+                    continue
+                if progress is not None:
+                    self.progress(*progress[0], **progress[1])
+                    progress = None
                 if code == Connector.CODE_TEXT:
                     self.update_text(*args)
-                elif code == Connector.CODE_PROGRESS:
-                    self.progress(*args, **kwargs)
                 elif code == Connector.CODE_MODIFY_BUTTON:
                     self.modify_but(*args)
                 elif code == Connector.CODE_SHOWRESULTS:
                     self.showResults(*args)
                 elif code == Connector.CODE_GRAPHS:
                     self.processGraph(args)
+                elif code == Connector.CODE_GRAPHS_DONE:
+                    self.update_text(GRAPHS_MSG % len(args))
                 else:
                     self.update_text('Unknown message...')
                 self.queue.task_done()
-                self.root.update()
         except Queue.Empty:
             pass
+        if progress is not None:
+            self.progress(*progress[0], **progress[1])
+        self.root.update()
         self.root.after(100, self.periodicUpdate)
 
     def modify_but(self, state, buttonlist):
@@ -34,13 +34,18 @@ __license__ = "GPL"
 __version__ = "1.1"
 
 
-#Create Connector
-conn = Connector.connection()
-
-#Check if there are arguments (Command line or GUI)
-if MainCL.startGUI:
-    import MainGUI
-    GUI = MainGUI.EMNN(conn)
-    GUI.startgui()
-else:
-    MainCL.startCL(conn)
+def main(argv=None):
+    '''Starts Simapse in command line or GUI mode. The GUI and the plotting
+       modules are only imported when they are used.'''
+    args = MainCL.parseargs(argv)
+
+    #Create Connector
+    conn = Connector.connection()
+
+    #Check if there are arguments (Command line or GUI)
+    if MainCL.startGUI(args):
+        import MainGUI
+        GUI = MainGUI.EMNN(conn)
+        GUI.startgui()
+    else:
+        MainCL.startCL(conn, args)
@@ -0,0 +1,688 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from contextlib import contextmanager
+from itertools import imap, izip
+from operator import itemgetter, mul
+from math import exp
+from random import Random
+import imp
+import time
+
+def available(module):
+    '''True if a module can be imported. numpy and numba are only found
+       here and imported when a backend using them runs, as they take most
+       of the startup time.'''
+    try:
+        imp.find_module(module)
+        return True
+    except ImportError:
+        return False
+
+NUMPY = available('numpy')
+JIT   = NUMPY and available('numba')
+
+REFERENCE = 'pure'
+AUTO      = 'auto'
+
+# Size of the calibration micro-benchmark
+CALIBRATION_PATTERNS   = 500
+CALIBRATION_ROC        = 2000
+CALIBRATION_ITERATIONS = 5
+CALIBRATION_REPEAT     = 3
+
+class backend():
+    '''Pure Python reference backend. Backends provide the compute kernels
+       used by nnEngine.NN (training epoch and batched forward pass) and by
+       nnFuncs.roc (ROC points). Accelerated backends subclass it and must
+       match its results (see benchmarks/equivalence.py).'''
+    name = REFERENCE
+
+    def epoch(self, net):
+        '''One online training iteration over all loaded patterns.'''
+        for p in xrange(0, net.Patterns):
+            net.currentPat = p
+            net.feedforward()
+            net.backpropag()
+
+    def train(self, net, iterations):
+        '''Online training iterations over all loaded patterns (backends
+           may convert the network and the patterns once for all of
+           them).'''
+        for i in xrange(iterations):
+            self.epoch(net)
+
+    def predict(self, net, inputs):
+        '''Network outputs for a list of patterns (no errors calculated).'''
+        func = net.func
+        values = inputs
+        for w in net.weights:
+            values = [[func(sum([x * y for x, y in zip(pattern, wn)]) + wn[-1])
+                       for wn in w] for pattern in values]
+        return values
+
+    def lossgradient(self, net):
+        '''Sum of squared errors (0.5 * sum((y - t)**2), all outputs) of all
+           loaded patterns and its gradient with respect to the weights
+           (nested as net.weights, bias last), used by the full-batch
+           optimizers (see nnOptimizers).'''
+        func, dfunc = net.func, net.dfunc
+        W = net.weights
+        grads = [[[0.0] * len(row) for row in layer] for layer in W]
+        error = 0.0
+        for pattern, target in izip(net.trainInputs, net.trainOutputs):
+            acts = [pattern]
+            for layer in W:
+                acts.append([func(sum([x * y for x, y in zip(acts[-1], row)])
+                                  + row[-1]) for row in layer])
+            for y, t in zip(acts[-1], target):
+                error += (y - t)**2
+            deltas = [(y - t) * dfunc(y) for y, t in zip(acts[-1], target)]
+            for l in xrange(len(W) - 1, -1, -1):
+                a = acts[l]
+                for n, row in enumerate(grads[l]):
+                    d = deltas[n]
+                    for i in xrange(len(a)):
+                        row[i] += d * a[i]
+                    row[-1] += d
+                if l:
+                    deltas = [dfunc(a[i]) * sum([deltas[n] * W[l][n][i]
+                                                 for n in xrange(len(W[l]))])
+                              for i in xrange(len(a))]
+        return 0.5 * error, grads
+
+    def rocpoints(self, real, pred):
+        '''(FP, TP) counts at each distinct predicted value (<= 1), taken
+           in decreasing order, plus the final counts.'''
+        FP, TP = 0.0, 0.0
+        points = []
+        combined = map(lambda x,y: [x,y], real,pred)
+        combined.sort(lambda x,y:cmp(x[1],y[1]), reverse=True)
+
+        temp = -1E400
+        for i in xrange(len(combined)):
+            if combined[i][1] != temp and combined[i][1] <= 1:
+                points.append((FP,TP))
+                temp = combined[i][1]
+            if combined[i][0] == 1:
+                TP += 1.0
+            else:
+                FP += 1.0
+            if len(combined) == 1:
+                points.append((FP,TP))
+        points.append((FP,TP))
+        return points
+
+# Constants of nnEngine.sigm (inlined by the optimized backend)
+E          = 2.7182818284590451
+SIGM_FLOOR = 1 / (1 + E**700)
+
+class optimizedbackend(backend):
+    '''Pure Python (stdlib only) engine with the same operations, in the
+       same order, as the reference, so results are identical. The index
+       ranges of each layer are built once per epoch, the inner loops use
+       local rows of weights and changes (the input pattern is not copied
+       and the bias is the last item of the row), the activation function
+       is inlined for sigm and the derivatives of the forward pass are
+       reused by the backpropagation instead of being recomputed.'''
+    name = 'optimized'
+
+    def epoch(self, net):
+        scheme = net.scheme
+        nl = len(scheme) - 1
+        if nl < 2:
+            return backend.epoch(self, net)
+        func, dfunc = net.func, net.dfunc
+        sigmoid = func.__name__ == 'sigm' and dfunc.__name__ == 'dsigm'
+        e, floor = E, SIGM_FLOOR
+        LR, M = net.LearningRate, net.momentum
+        W, C = net.weights, net.changes
+        inputs, targets = net.trainInputs, net.trainOutputs
+
+        #Outputs and derivatives of each layer (reused for all patterns)
+        #and, per layer, the index ranges of its inputs and neurons
+        acts = [None] + [[0.0] * n for n in scheme[1:]]
+        ders = [[0.0] * n for n in scheme[1:]]
+        layers = [(l, W[l], C[l], range(scheme[l]), range(scheme[l + 1]),
+                   acts[l + 1], ders[l]) for l in xrange(nl)]
+        down = layers[::-1]
+        outputs = layers[-1][4]
+
+        for p in xrange(net.Patterns):
+            #FEED FORWARD
+            prev = acts[0] = inputs[p]
+            for l, rows, crows, rin, rout, act, der in layers:
+                for n in rout:
+                    row = rows[n]
+                    h = 0.0
+                    for w in rin:
+                        h += prev[w] * row[w]
+                    h += row[-1]
+                    if sigmoid:
+                        if h < -700:
+                            y = floor
+                        else:
+                            y = 1 / (1 + e**(-h))
+                        act[n] = y
+                        der[n] = y * (1 - y)
+                    else:
+                        y = act[n] = func(h)
+                        der[n] = dfunc(y)
+                prev = act
+            target = targets[p]
+            err = [prev[o] - target[o] for o in outputs]
+
+            #BACK PROPAGATION
+            #Errors of the layer below are computed with the weights before
+            #the update (none for the inputs)
+            for l, rows, crows, rin, rout, act, der in down:
+                a = acts[l]
+                if l:
+                    below = [0.0] * (len(rin) + 1)
+                for n in rout:
+                    row, crow, en = rows[n], crows[n], err[n]
+                    LRd = LR * (der[n] * en)
+                    if l:
+                        for w in rin:
+                            x = row[w]
+                            below[w] += x * en
+                            change = LRd * a[w] + M * crow[w]
+                            row[w] = x - change
+                            crow[w] = change
+                    else:
+                        for w in rin:
+                            change = LRd * a[w] + M * crow[w]
+                            row[w] = row[w] - change
+                            crow[w] = change
+                    row[-1] = row[-1] - LRd
+                if l:
+                    err = below
+
+        # Leaves the network as the reference does
+        if net.Patterns:
+            net.currentPat = net.Patterns - 1
+            net.values = acts[1:]
+            net.derivatives = ders
+            net.errPat = [acts[-1][o] - targets[-1][o] for o in outputs]
+
+    def predict(self, net, inputs):
+        func = net.func
+        values = inputs
+        for w in net.weights:
+            values = [[func(sum(imap(mul, pattern, wn)) + wn[-1]) for wn in w]
+                      for pattern in values]
+        return values
+
+    def rocpoints(self, real, pred):
+        combined = zip(real, pred)
+        combined.sort(key=itemgetter(1), reverse=True)
+        FP, TP = 0.0, 0.0
+        points = []
+        append = points.append
+        temp = -1E400
+        for value, predicted in combined:
+            if predicted != temp and predicted <= 1:
+                append((FP, TP))
+                temp = predicted
+            if value == 1:
+                TP += 1.0
+            else:
+                FP += 1.0
+        if len(combined) == 1:
+            append((FP, TP))
+        append((FP, TP))
+        return points
+
+if NUMPY:
+    def npsigm(x):
+        '''Vectorized sigm() for numpy arrays.'''
+        import numpy as np
+        return 1 / (1 + np.exp(-np.maximum(x, -700)))
+
+    def nptanh(x):
+        '''Vectorized tanh() for numpy arrays.'''
+        import numpy as np
+        return np.tanh(x)
+
+    # numpy equivalents of the nnEngine activation functions (by name)
+    NP_FUNCS = {'sigm': npsigm, 'tanh': nptanh}
+    NP_DFUNCS = {'sigm': lambda y: y * (1 - y), 'tanh': lambda y: 1 - y**2}
+
+    class numpybackend(backend):
+        '''Vectorized forward pass and ROC points with numpy. Results match
+           the reference up to floating point rounding. Online training is
+           sequential by pattern and uses the reference epoch.'''
+        name = 'numpy'
+
+        def predict(self, net, inputs):
+            import numpy as np
+            if net.func.__name__ not in NP_FUNCS:
+                return backend.predict(self, net, inputs)
+            npfunc = NP_FUNCS[net.func.__name__]
+            values = np.array(inputs, dtype=float)
+            for w in net.weights:
+                w = np.array(w)
+                values = npfunc(np.dot(values, w[:, :-1].T) + w[:, -1])
+            return values.tolist()
+
+        def lossgradient(self, net):
+            import numpy as np
+            if net.func.__name__ not in NP_FUNCS:
+                return backend.lossgradient(self, net)
+            func = NP_FUNCS[net.func.__name__]
+            dfunc = NP_DFUNCS[net.func.__name__]
+            W = [np.array(w) for w in net.weights]
+            acts = [np.array(net.trainInputs, dtype=float)]
+            for w in W:
+                acts.append(func(np.dot(acts[-1], w[:, :-1].T) + w[:, -1]))
+            targets = np.array(net.trainOutputs, dtype=float)
+            deltas = (acts[-1] - targets) * dfunc(acts[-1])
+            grads = [None] * len(W)
+            for l in xrange(len(W) - 1, -1, -1):
+                grads[l] = np.hstack((np.dot(deltas.T, acts[l]),
+                                      deltas.sum(0)[:, None])).tolist()
+                if l:
+                    deltas = np.dot(deltas, W[l][:, :-1]) * dfunc(acts[l])
+            return 0.5 * ((acts[-1] - targets)**2).sum(), grads
+
+        def rocpoints(self, real, pred):
+            import numpy as np
+            real, pred = np.asarray(real), np.asarray(pred, dtype=float)
+            order = np.argsort(-pred, kind='mergesort')
+            real, pred = real[order], pred[order]
+            TP = np.concatenate(([0.0], np.cumsum(real == 1)))
+            FP = np.concatenate(([0.0], np.cumsum(real != 1)))
+            # A point before each new predicted value (values above 1 are
+            # skipped and sorted first)
+            valid = pred <= 1
+            new = valid.copy()
+            new[1:] &= (pred[1:] != pred[:-1]) | ~valid[:-1]
+            index = np.flatnonzero(new)
+            points = zip(FP[index].tolist(), TP[index].tolist())
+            if len(pred) == 1:
+                points.append((FP[1], TP[1]))
+            points.append((float(FP[-1]), float(TP[-1])))
+            return points
+
+    class netstack():
+        '''Same-shaped networks (one per repetition) stacked as one weight
+           tensor per layer, (networks, neurons, inputs + bias), and trained
+           together: each step updates all networks with their own pattern,
+           so every network follows its own online training. Networks with
+           fewer patterns are masked once their patterns are exhausted.
+           Each network keeps its own momentum (changes), so results match
+           training each of the given networks one by one up to floating
+           point rounding. Note that Manager.model reuses one network for
+           the repetitions trained one by one, whose momentum carries over
+           from the previous repetition, so only the first repetition
+           matches those results.'''
+        def __init__(self, nets):
+            import numpy as np
+            net = nets[0]
+            if net.func.__name__ not in NP_FUNCS:
+                raise ValueError('No numpy activation function for %s' %
+                                 net.func.__name__)
+            self.nets = nets
+            self.func = NP_FUNCS[net.func.__name__]
+            self.dfunc = NP_DFUNCS[net.func.__name__]
+            self.LR, self.M = net.LearningRate, net.momentum
+            nl = len(net.weights)
+            self.weights = [np.array([n.weights[l] for n in nets])
+                            for l in xrange(nl)]
+            self.changes = [np.array([n.changes[l] for n in nets])
+                            for l in xrange(nl)]
+
+        def pad(self, data):
+            '''Stacks the patterns of each network (list of lists of
+               patterns) in an array padded with zeros. Returns the array
+               and the number of patterns of each network.'''
+            import numpy as np
+            counts = np.array([len(x) for x in data])
+            width = max([len(x[0]) for x in data if x] or [0])
+            stacked = np.zeros((len(data), counts.max(), width))
+            for i, x in enumerate(data):
+                if x:
+                    stacked[i, :len(x)] = x
+            return stacked, counts
+
+        def loaddata(self, inputs, targets):
+            '''Train patterns and targets of each network.'''
+            self.inputs, self.counts = self.pad(inputs)
+            self.targets = self.pad(targets)[0]
+
+        def epoch(self):
+            '''One online training iteration of all networks.'''
+            import numpy as np
+            W, C = self.weights, self.changes
+            func, dfunc = self.func, self.dfunc
+            LR, M = self.LR, self.M
+            nets = len(self.nets)
+            for p in xrange(self.inputs.shape[1]):
+                sel = np.flatnonzero(self.counts > p)
+                if len(sel) == nets:
+                    sel = slice(None)
+                Ws = [w[sel] for w in W]
+                #FEED FORWARD
+                acts, ders = [self.inputs[sel, p]], []
+                for w in Ws:
+                    y = func(np.einsum('rni,ri->rn', w[:, :, :-1], acts[-1]) +
+                             w[:, :, -1])
+                    acts.append(y)
+                    ders.append(dfunc(y))
+                err = acts[-1] - self.targets[sel, p]
+
+                #BACK PROPAGATION (errors below with the weights before
+                #the update)
+                for l in xrange(len(W) - 1, -1, -1):
+                    w = Ws[l]
+                    LRd = LR * (ders[l] * err)
+                    if l:
+                        below = np.einsum('rn,rni->ri', err, w[:, :, :-1])
+                    change = (LRd[:, :, None] * acts[l][:, None, :] +
+                              M * C[l][sel][:, :, :-1])
+                    w[:, :, :-1] -= change
+                    w[:, :, -1] -= LRd
+                    W[l][sel] = w
+                    C[l][sel, :, :-1] = change
+                    if l:
+                        err = below
+
+        def train(self, iterations):
+            '''Trains all networks for a number of iterations.'''
+            for i in xrange(iterations):
+                self.epoch()
+
+        def predict(self, inputs):
+            '''Outputs of each network for its list of patterns.'''
+            import numpy as np
+            values, counts = self.pad(inputs)
+            for w in self.weights:
+                values = self.func(np.einsum('rpi,rni->rpn', values,
+                                             w[:, :, :-1]) +
+                                   w[:, None, :, -1])
+            return [values[i, :counts[i]].tolist()
+                    for i in xrange(len(counts))]
+
+        def unstack(self):
+            '''Copies the trained weights and changes back to the networks.'''
+            for i, net in enumerate(self.nets):
+                net.weights = [w[i].tolist() for w in self.weights]
+                net.changes = [c[i].tolist() for c in self.changes]
+
+def onlineepoch(W, C, X, T, offsets, scheme, LR, M, sigmoid,
+                act, der, err, below):
+    '''One online training iteration (the reference feedforward and
+       backpropag, pattern by pattern and with the same operations in the
+       same order) over flat buffers: W and C are the weights and changes
+       of all layers (rows of each neuron with the bias last, the layer l
+       starting at offsets[l]), X and T the patterns and targets, act and
+       der the outputs and derivatives of all layers and err/below work
+       buffers as large as the widest layer plus one. sigmoid selects
+       sigm (otherwise tanh). Compiled by numba with loadjit().'''
+    nl = len(scheme) - 1
+    last = 0
+    for l in range(nl - 1):
+        last += scheme[l + 1]
+    for p in range(X.shape[0]):
+        #FEED FORWARD
+        aprev = 0
+        aoff = 0
+        for l in range(nl):
+            nin = scheme[l]
+            for n in range(scheme[l + 1]):
+                r = offsets[l] + n * (nin + 1)
+                h = 0.0
+                for i in range(nin):
+                    if l == 0:
+                        h += X[p, i] * W[r + i]
+                    else:
+                        h += act[aprev + i] * W[r + i]
+                h += W[r + nin]
+                if sigmoid:
+                    if h < -700:
+                        y = 1 / (1 + E**700)
+                    else:
+                        y = 1 / (1 + E**(-h))
+                    d = y * (1 - y)
+                else:
+                    if h > 20:
+                        y = 1.0
+                    elif h < -20:
+                        y = -1.0
+                    else:
+                        a = exp(h)
+                        b = exp(h * -1)
+                        y = (a - b) / (a + b)
+                    d = 1 - (y**2)
+                act[aoff + n] = y
+                der[aoff + n] = d
+            aprev = aoff
+            aoff += scheme[l + 1]
+        for o in range(scheme[nl]):
+            err[o] = act[last + o] - T[p, o]
+
+        #BACK PROPAGATION
+        aoff = last
+        for l in range(nl - 1, -1, -1):
+            nin = scheme[l]
+            aprev = aoff - nin
+            for i in range(nin + 1):
+                below[i] = 0.0
+            for n in range(scheme[l + 1]):
+                r = offsets[l] + n * (nin + 1)
+                e = err[n]
+                LRd = LR * (der[aoff + n] * e)
+                for i in range(nin):
+                    w = W[r + i]
+                    if l > 0:
+                        below[i] += w * e
+                        c = LRd * act[aprev + i] + M * C[r + i]
+                    else:
+                        c = LRd * X[p, i] + M * C[r + i]
+                    W[r + i] = w - c
+                    C[r + i] = c
+                W[r + nin] = W[r + nin] - LRd
+            for i in range(nin):
+                err[i] = below[i]
+            aoff = aprev
+
+def onlinetrain(iterations, W, C, X, T, offsets, scheme, LR, M, sigmoid,
+                act, der, err, below):
+    '''Runs onlineepoch() iterations times over the same buffers.'''
+    for i in range(iterations):
+        onlineepoch(W, C, X, T, offsets, scheme, LR, M, sigmoid,
+                    act, der, err, below)
+
+_compiled = []
+
+def loadjit():
+    '''Imports numba and compiles onlineepoch() and onlinetrain() (on
+       their first call) the first time it is called. Returns False when
+       numba is not available, leaving them as plain Python.'''
+    global onlineepoch, onlinetrain
+    if not JIT:
+        return False
+    if not _compiled:
+        from numba import njit
+        onlineepoch = njit(onlineepoch)
+        onlinetrain = njit(onlinetrain)
+        _compiled.append(True)
+    return True
+
+if NUMPY:
+    def flattrain(net, iterations, kernel = None):
+        '''Trains a sigm or tanh network with the flat buffers kernel
+           (onlinetrain() by default): the weights, changes and patterns
+           are converted once, all iterations are run by the kernel and the
+           network is left as the reference leaves it. Before loadjit()
+           (or with kernel=onlinetrain.py_func) the kernel runs as plain
+           Python.'''
+        kernel = kernel or onlinetrain
+        import numpy as np
+        scheme = np.array(net.scheme, dtype=np.int64)
+        sizes = [len(l) * len(l[0]) for l in net.weights]
+        offsets = np.cumsum([0] + sizes[:-1]).astype(np.int64)
+        W = np.array([w for l in net.weights for n in l for w in n])
+        C = np.array([c for l in net.changes for n in l for c in n])
+        X = np.array(net.trainInputs, dtype=float)
+        T = np.array(net.trainOutputs, dtype=float)
+        act, der = np.zeros(sum(scheme[1:])), np.zeros(sum(scheme[1:]))
+        err, below = np.zeros(max(scheme) + 1), np.zeros(max(scheme) + 1)
+        kernel(iterations, W, C, X, T, offsets, scheme, net.LearningRate,
+               net.momentum, net.func.__name__ == 'sigm', act, der, err,
+               below)
+
+        # Back to the nested lists, leaving the network as the
+        # reference does
+        W, C, act, der = W.tolist(), C.tolist(), act.tolist(), der.tolist()
+        start = 0
+        for l, layer in enumerate(net.weights):
+            width = len(layer[0])
+            for n in xrange(len(layer)):
+                layer[n][:] = W[start:start + width]
+                net.changes[l][n][:] = C[start:start + width]
+                start += width
+        values, derivatives = [], []
+        start = 0
+        for n in net.scheme[1:]:
+            values.append(act[start:start + n])
+            derivatives.append(der[start:start + n])
+            start += n
+        net.currentPat = net.Patterns - 1
+        net.values = values
+        net.derivatives = derivatives
+        net.errPat = [values[-1][o] - net.trainOutputs[-1][o]
+                      for o in xrange(net.scheme[-1])]
+
+if JIT:
+    class jitbackend(numpybackend):
+        '''numpy backend with the online training compiled by numba
+           (onlinetrain() over flat arrays, converted once per train()
+           call). Results are identical to the reference for sigm and tanh
+           networks; other activation functions use the reference epoch.'''
+        name = 'jit'
+
+        def epoch(self, net):
+            self.train(net, 1)
+
+        def train(self, net, iterations):
+            if net.func.__name__ not in ('sigm', 'tanh') or not net.Patterns:
+                return backend.train(self, net, iterations)
+            if iterations > 0:
+                loadjit()
+                flattrain(net, iterations)
+
+BACKENDS = {}
+ORDER    = []
+
+def register(cls):
+    '''Registers a backend class (by its name).'''
+    if cls.name not in BACKENDS:
+        ORDER.append(cls.name)
+    BACKENDS[cls.name] = cls()
+    return cls
+
+register(backend)
+register(optimizedbackend)
+if NUMPY:
+    register(numpybackend)
+if JIT:
+    register(jitbackend)
+
+def names():
+    '''Names of the available backends (reference first).'''
+    return list(ORDER)
+
+_active = [BACKENDS[REFERENCE]]
+_calibrated = {}
+
+def active():
+    '''Returns the backend in use.'''
+    return _active[0]
+
+def select(name, scheme=None):
+    '''Sets the backend in use by name. With 'auto', the fastest backend for
+       a network scheme is chosen by calibrate(). Returns the backend.'''
+    if name in (AUTO, 'jit'):
+        loadjit()
+    if name == AUTO:
+        name = calibrate(scheme)
+    if name not in BACKENDS:
+        raise ValueError('Unknown or unavailable backend: %s' % name)
+    _active[0] = BACKENDS[name]
+    return _active[0]
+
+@contextmanager
+def using(name):
+    '''Context manager using a backend temporarily.'''
+    previous = _active[0]
+    _active[0] = BACKENDS[name]
+    try:
+        yield _active[0]
+    finally:
+        _active[0] = previous
+
+def calibrate(scheme=None, seed=0):
+    '''Short micro-benchmark of the available backends on a random network
+       with the given scheme (training iterations as trainnet runs them,
+       batched forward pass and ROC). Returns the name of the fastest
+       backend (cached by scheme).'''
+    import nnEngine
+    scheme = list(scheme or [5, 3, 1])
+    key = tuple(scheme)
+    if key in _calibrated:
+        return _calibrated[key]
+    if len(ORDER) == 1:
+        _calibrated[key] = ORDER[0]
+        return ORDER[0]
+
+    rnd = Random(seed)
+    inputs = [[rnd.gauss(0, 1) for x in xrange(scheme[0])]
+              for p in xrange(CALIBRATION_PATTERNS)]
+    targets = [[float(rnd.random() < 0.5)] * scheme[-1] for x in inputs]
+    real = [float(rnd.random() < 0.5) for x in xrange(CALIBRATION_ROC)]
+    pred = [rnd.random() for x in real]
+    net = nnEngine.NN(scheme, iterations=1, verbosity=0)
+    weights = [[[rnd.random() - 0.5 for w in n] for n in l]
+               for l in net.weights]
+
+    times = {}
+    for name in ORDER:
+        with using(name) as bk:
+            best = None
+            for i in xrange(CALIBRATION_REPEAT):
+                net.weights = [[n[:] for n in l] for l in weights]
+                net.loaddata(inputs[:100], targets[:100])
+                start = time.time()
+                bk.train(net, CALIBRATION_ITERATIONS)
+                bk.predict(net, inputs)
+                bk.rocpoints(real, pred)
+                elapsed = time.time() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+        times[name] = best
+    fastest = min(ORDER, key=lambda x: times[x])
+    _calibrated[key] = fastest
+    return fastest
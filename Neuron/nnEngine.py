@@ -26,6 +26,9 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from random import random
 from math import exp
 
+import nnBackends
+import nnOptimizers
+
 class NN():
     def __init__(self, scheme=[], iterations=1000, LR=0.9, momentum=0.0, verbosity = 1):
         # l - representa layer
@@ -49,6 +52,9 @@ class NN():
         self.func = sigm
         self.dfunc = dsigm
 
+        self.optimizer = nnOptimizers.SGD
+        self.optstate = None
+
         self.verbosity = verbosity
 
 
@@ -61,17 +67,23 @@ class NN():
         if verbose == None:
             verbose = self.verbosity
 
+        #Each epoch feeds forward and back propagates all patterns
+        #(see nnBackends for the available implementations). Other
+        #optimizers update the weights with the gradient of all patterns
+        optimizer = getattr(self, 'optimizer', nnOptimizers.SGD)
+        if optimizer == nnOptimizers.SGD:
+            epoch = nnBackends.active().epoch
+            if verbose <> 1:
+                #All iterations in one call, so backends can convert the
+                #network and the patterns only once
+                nnBackends.active().train(self, self.iterations)
+                return
+        else:
+            step = nnOptimizers.get(optimizer).step
+            lossgradient = nnBackends.active().lossgradient
+            epoch = lambda net: step(net, lossgradient)
         for i in xrange(0, self.iterations):
-            for p in xrange(0, self.Patterns):
-                self.currentPat = p
-
-                #calculate the current network output
-                #and error for this pattern
-                #FEED FORWARD
-                self.feedforward()
-                # change weights on network
-                # BACK PROPAGATION
-                self.backpropag()
+            epoch(self)
 
             #error for this iteration
             if verbose == 1:
@@ -134,6 +146,16 @@ class NN():
 
         return finalresults
 
+    def predict(self, inputs):
+        '''Returns the network output for a sequence of inputs computed in a
+           single batched pass (layer by layer for all patterns). Unlike
+           testnet() it does not calculate pattern errors, so no targets
+           are needed and the loaded train data is left untouched. It is
+           computed by the backend in use (see nnBackends).'''
+        if type(inputs[0]) is not list:
+            inputs = [inputs]
+        return nnBackends.active().predict(self, inputs)
+
     def neterror(self, inputs = None, targets = None, errorType = 'SSerror'):
         '''Calculates the overall error of the network.
            Options for error type are:
@@ -436,6 +458,7 @@ class NN():
             for n in xrange(len(w[l])):
                 w[l][n] = [(random() - 0.5) for x in w[l][n]]
         self.weights = w
+        self.optstate = None
 
     def XORexample(self):
         #Fazer um data loader com calculo automatico do self.pattern
@@ -474,6 +497,8 @@ def savenet(net, netfile):
         value = netvars[var]
         if hasattr(value, '__call__'):
             value = value.__name__
+        elif type(value) is str:
+            value = repr(value)
         line = str(var) + ';' + str(value) + '\n' 
         f.write(line)
     f.close()
@@ -517,7 +542,6 @@ def sigm(x):
 def dsigm(y):
     return y * (1 - y)
 
-
 if __name__ == '__main__':
     nn = NN([2,3,1], iterations=10000, LR=0.8, momentum=0.0)
     nn.XORexample()
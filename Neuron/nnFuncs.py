@@ -25,6 +25,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from os import curdir, path
 
+from nnMonitor import nostage
+import nnBackends
+import nnRecorder
+
 #from matplotlib.backends.backend_agg import FigureCanvasAgg
 #from matplotlib import figure, cm, ticker
 #import numpy as np
@@ -38,6 +42,9 @@ ERROR_HEADER = 'ERROR: Please check the raster %s! The number of cols or ' +\
                'rows found in the raster does not correspond to values on ' +\
                'the header.'
 
+# Maximum number of patterns evaluated in a single batched call
+CHUNK_SIZE = 100000
+
 conn = None
 def sendout(func, *args, **kwargs):
     '''Sends information to console or gui'''
@@ -53,6 +60,12 @@ def sendout(func, *args, **kwargs):
         elif func == 'progress':
             conn.progress_bar(*args, **kwargs)
 
+def stage(name):
+    '''Times a sub-stage with the monitor of the connection (if any)'''
+    if conn == None:
+        return nostage()
+    return conn.monitor.stage(name)
+
 def read_ascii(filename, output = 0):
     '''Reads data from ascii raster file and the corner's coordinates
        The output option may be:
@@ -318,7 +331,8 @@ class spatial_functions:
                 # NO limit set!!! TODO: add a warning if more than 1000 pseudoabsences!
                 #if pa > 1000:
                 #    pa = 1000
-                a_data, a_coordinates, a_MyData = self.pseudo_absences(coordinates, pa)
+                with stage('pseudo-absence'):
+                    a_data, a_coordinates, a_MyData = self.pseudo_absences(coordinates, pa)
                 data = data + a_data
                 coordinates = coordinates + a_coordinates
                 MyData = MyData + a_MyData                
@@ -409,7 +423,8 @@ class spatial_functions:
             myfile.write(export)
         myfile.close()
 
-    def rastercalc(self, func, rasterdic, outname = None, order = None):
+    def rastercalc(self, func, rasterdic, outname = None, order = None,
+                   batch = False):
         '''Computes a final map by apllying a function 'func' to the same
            pixel in all rasters. The function input is a list of all rasters'
            values for each pixel and, if outname is None, returns the new 
@@ -417,7 +432,11 @@ class spatial_functions:
             
             func      - Function to apply
             outname   - Name for the output ascii raster (adds the self.out_dir to the name)
-            rasterdic - Dictionary of all rasters'''
+            rasterdic - Dictionary of all rasters
+            batch     - If True, func is called once with the list of the
+                        values of all pixels with data (e.g. NN.predict)'''
+        if batch:
+            return self._batchcalc(func, rasterdic, outname, order)
 
         FinalModel = [[0.0] * self.ncols for x in xrange(self.nrows)]
 
@@ -441,30 +460,91 @@ class spatial_functions:
             self.write_ascii(FinalModel, outname)
             return
 
-    def modelstats(self, rasters, outdir = None, output = True, sufix=''):
+    def _batchcalc(self, func, rasterdic, outname = None, order = None):
+        '''rastercalc() with a single call of func for all pixels.'''
+        rasters = rasterdic.keys()
+        if order:
+            rasters = order
+        grids = [rasterdic[raster] for raster in rasters]
+        cells = [(row, col) for row in xrange(self.nrows)
+                 for col in xrange(self.ncols)
+                 if self.nodata_list[row][col] <> 1]
+        FinalModel = [[self.nodata] * self.ncols for x in xrange(self.nrows)]
+        if cells:
+            results = func([[grid[row][col] for grid in grids]
+                            for row, col in cells])
+            for (row, col), value in zip(cells, results):
+                FinalModel[row][col] = reducelist(value)
+
+        if outname == None:
+            return FinalModel
+        else:
+            self.write_ascii(FinalModel, outname)
+            return
+
+    def modelstats(self, rasters, outdir = None, output = True, sufix='',
+                   statefile = None, append = False):
         '''Computes the final average and standard deviation models and saves as ascii raster.
-           When output is True, returns average and standard deviation rasters.'''
+           When output is True, returns average and standard deviation rasters.
+           With a statefile, the per pixel running statistics are saved in it
+           and, if append is True, the rasters already included there are
+           skipped and the new ones are added to the saved statistics.'''
 
         if outdir == None:
             outdir = self.out_dir
 
+        if sufix != "":
+            sufix = '_' + sufix
+
+        stats, names = {}, []
+        if statefile and append:
+            stats, names = nnRecorder.loadstate(statefile, 'average' + sufix)
+            rasters = [x for x in rasters if path.basename(x) not in names]
+
         #Create a dictionary of rasters
         rasterdic = {}
         for raster in rasters:
             rasterdic[raster] = read_ascii(raster, 0)
 
         N = float(len(rasters))
-        
-        #Averages all maps
-        average = lambda x: float(sum(x)) / N
-        avg = self.rastercalc(average, rasterdic)
+
+        if N:
+            #Averages all maps
+            average = lambda x: float(sum(x)) / N
+            avg = self.rastercalc(average, rasterdic)
+
+            #Sum of squared deviations of all maps
+            sqdev = lambda x: sum([(value - avg[self.Row][self.Col])**2 for value in x])
+            m2 = self.rastercalc(sqdev, rasterdic)
+
+        if None in stats:
+            #Merges with the saved statistics of the previous rasters
+            count, shp, mean, oldm2 = stats[None]
+            total = count + N
+            if N:
+                for row in xrange(self.nrows):
+                    for col in xrange(self.ncols):
+                        if self.nodata_list[row][col] == 1:
+                            continue
+                        i = row * self.ncols + col
+                        delta = avg[row][col] - mean[i]
+                        avg[row][col] = mean[i] + delta * N / total
+                        m2[row][col] += oldm2[i] + delta**2 * count * N / total
+            else:
+                unflat = lambda x: [x[i:i + self.ncols] for i in xrange(0, len(x), self.ncols)]
+                avg, m2 = unflat(mean), unflat(oldm2)
+            N = total
 
         #Calculate standard deviation of all maps:
-        stdev = lambda x: ((sum([(value - avg[self.Row][self.Col])**2 for value in x])) / N)**0.5
-        std = self.rastercalc(stdev, rasterdic)
+        stdev = lambda x: (x[0] / N)**0.5
+        std = self.rastercalc(stdev, {'m2': m2})
 
-        if sufix != "":
-            sufix = '_' + sufix
+        if statefile:
+            flat = lambda raster: [x for line in raster for x in line]
+            names += [path.basename(x) for x in rasters]
+            nnRecorder.savestate(statefile, 'average' + sufix,
+                                 {None: (int(N), (self.nrows, self.ncols),
+                                         flat(avg), flat(m2))}, names)
 
         average_file = outdir + "/average" + sufix + ".txt"
         std_file = outdir + "/std" + sufix + ".txt"
@@ -644,28 +724,9 @@ class roc():
 
             self.counter= (P,N)
 
-            #Initiate False and True Positives counter
-            FP, TP = 0.0, 0.0
-            points = []
-            
-            #Sort the real values by the predicted values
-            combined = map(lambda x,y: [x,y], real,pred)
-            combined.sort(lambda x,y:cmp(x[1],y[1]), reverse=True)
-
-            temp = -1E400
-            #For all available values
-            for i in xrange(len(combined)):
-                if combined[i][1] != temp and combined[i][1] <= 1:
-                    points.append((FP,TP))
-                    temp = combined[i][1]
-                if combined[i][0] == 1:
-                    TP += 1.0
-                else:
-                    FP += 1.0
-                if len(combined) == 1:
-                    points.append((FP,TP))
-            points.append((FP,TP))
-            self.points = points
+            #False and True Positives counts of the real values sorted by
+            #the predicted values (computed by the backend in use)
+            self.points = nnBackends.active().rocpoints(real, pred)
             self.RocPoints = None
 
         except Exception, e:
@@ -718,6 +779,13 @@ class roc():
         prplot = zip(*self.PRPoints)
         return rocplot, prplot, aucROC, aucPR
 
+def pairname(raster1, raster2):
+    '''Returns the name of the interaction between two raster variables.
+       A '-' (or '%') in the raster names is written as %2D (or %25), so
+       the separator is never ambiguous (e.g. 'a-b' and 'c' give a%2Db-c).'''
+    escape = lambda name: name.replace('%', '%25').replace('-', '%2D')
+    return '%s-%s' % (escape(raster1), escape(raster2))
+
 class profiler():
     '''Produces the range of each variable and stores the real and the
        standardized values.'''
@@ -741,6 +809,11 @@ class profiler():
         self.pvars = percent_vars
         self.rvars = real_vars
 
+    def _evaluate(self, design, func):
+        '''Evaluates all patterns of a design matrix with a single call to
+           'func' (e.g. NN.predict) and returns a plain list of outputs.'''
+        return [reducelist(x) for x in func(design)]
+
     def onewayprofile(self, raster, func):
         '''Calculates the profile for a raster variable.'''
         pvars = self.pvars
@@ -748,40 +821,77 @@ class profiler():
         pos = self.order.index(raster)
         N = len(self.order)
 
-        # For each raster creates a temporary list for varsur and profile to append results
-        profile = []
+        #Creates the profile design with all values 0.0 except for raster
+        design = []
         for value in xrange(r+1):
-            #Creates the profile data with all values 0.0 except for raster
             temp = [0.0] * N
             temp[pos] = pvars[raster][value] 
-            profile.append(reducelist(func(temp)))
-   
-        return profile
+            design.append(temp)
 
-    def twowayprofile(self, raster1, raster2, func):
-        '''Creates a two-way profile: one raster variable against others'''
+        return self._evaluate(design, func)
+
+    def _twowaydesign(self, raster1, raster2):
+        '''Returns the design matrix of a two-way profile: (r+1)**2 patterns
+           with raster1 in the columns and raster2 in the rows (from the top
+           of the grid), all other variables set to 0.0'''
         pvars = self.pvars
         r = self.r
         pos1 = self.order.index(raster1)
         pos2 = self.order.index(raster2)
         N = len(pvars.keys())
 
-        # For each raster creates a temporary list for varsur and profile to append results
-        twowayprof = []
+        design = []
         for row in xrange(r, -1, -1):
             temp = [0.0] * N
             temp[pos2] = pvars[raster2][row] 
-            twowayprof.append([])
             for col in xrange(r+1):
                 temp[pos1] = pvars[raster1][col] 
-                twowayprof[r-row].append(reducelist(func(temp)))
+                design.append(temp[:])
+        return design
 
-        return twowayprof
+    def twowayprofile(self, raster1, raster2, func):
+        '''Creates a two-way profile: one raster variable against others'''
+        r = self.r
+        outputs = self._evaluate(self._twowaydesign(raster1, raster2), func)
+        return [outputs[x:x+r+1] for x in xrange(0, len(outputs), r+1)]
+
+    def pairs(self):
+        '''Returns a list of all pairs of raster variables following order.'''
+        order = self.order
+        N = len(order)
+        return [(order[x], order[y]) for x in xrange(N) for y in xrange(x+1, N)]
+
+    def interactions(self, func, chunk=CHUNK_SIZE):
+        '''Processes the two-way interaction surfaces for all pairs of raster
+           variables. The designs of all pairs are stacked and evaluated
+           together with func, in batches of at most 'chunk' patterns to keep
+           memory bounded. Returns a dictionary of surfaces with pairname()
+           as keys.'''
+        r = self.r
+        size = (r+1)**2
+        pairs = self.pairs()
+
+        outputs, design = [], []
+        for raster1, raster2 in pairs:
+            design.extend(self._twowaydesign(raster1, raster2))
+            if len(design) >= chunk:
+                outputs.extend(self._evaluate(design, func))
+                design = []
+        if design:
+            outputs.extend(self._evaluate(design, func))
+
+        surfaces = {}
+        for i in xrange(len(pairs)):
+            surface = outputs[i*size:(i+1)*size]
+            surfaces[pairname(*pairs[i])] = [surface[x:x+r+1] for x in
+                                             xrange(0, size, r+1)]
+        return surfaces
 
     def varsurface(self, raster, func):
         '''Processes the variation surface for one raster, i.e., the
           variation of prediction of one raster variable throughout all the
-          others' raster variables range.'''
+          others' raster variables range. All the (r+1)**2 patterns are
+          evaluated in a single batched call to func.'''
 
         pvars = self.pvars
         r = self.r
@@ -792,17 +902,62 @@ class profiler():
         others = self.order[:]
         others.remove(raster)
 
-        # For each raster creates a temporary list for varsur and profile to append results
-        varsur = []
+        # Design matrix with (r+1)**2 patterns, rows from the top of the grid
+        design = []
         for row in xrange(r, -1, -1):
             temp = [0.0] * N
-            varsur.append([])
             for other in others:
                 temp[pos(other)] = pvars[other][row]
 
             for col in xrange(r+1):
                 temp[pos(raster)] = pvars[raster][col]
-                varsur[r-row].append(reducelist(func(temp)))
-
-        return varsur
-
+                design.append(temp[:])
+
+        outputs = self._evaluate(design, func)
+        return [outputs[x:x+r+1] for x in xrange(0, len(outputs), r+1)]
+
+class convergence():
+    '''Follows the running average of an ensemble of networks on a fixed
+       sample of pixels and the running average of the variable importance,
+       and tells when adding repetitions no longer changes them.'''
+    def __init__(self, inputs, tolerance, patience, minimum = 1):
+        '''inputs    - Values of the variables at the sampled pixels
+           tolerance - Largest change of the averages considered stable
+           patience  - Consecutive stable repetitions needed to stop
+           minimum   - Minimum number of repetitions before stopping'''
+        self.inputs = inputs
+        self.tolerance = tolerance
+        self.patience = patience
+        self.minimum = minimum
+        self.count = 0
+        self.stable = 0
+        self.mapavg = None
+        self.impavg = None
+        self.changes = None
+
+    def add(self, predict, varimp):
+        '''Adds a repetition (the predict function of its network and its
+           variable importance) and returns True when the averages are
+           stable. The change of the map is the mean absolute change of the
+           pixels and the change of the variable importance is the largest
+           change relative to the total importance.'''
+        outputs = [reducelist(x) for x in predict(self.inputs)]
+        self.count += 1
+        if self.count == 1:
+            self.mapavg, self.impavg = outputs, list(varimp)
+            return False
+        N = float(self.count)
+        mapavg = [m + (x - m) / N for m, x in zip(self.mapavg, outputs)]
+        impavg = [m + (x - m) / N for m, x in zip(self.impavg, varimp)]
+        mapchange = sum([abs(x - y) for x, y in zip(mapavg, self.mapavg)])
+        mapchange /= max(len(mapavg), 1)
+        total = sum([abs(x) for x in impavg]) or 1.0
+        impchange = max([abs(x - y) for x, y in zip(impavg, self.impavg)])
+        impchange /= total
+        self.mapavg, self.impavg = mapavg, impavg
+        self.changes = (mapchange, impchange)
+        if max(self.changes) < self.tolerance:
+            self.stable += 1
+        else:
+            self.stable = 0
+        return self.count >= self.minimum and self.stable >= self.patience
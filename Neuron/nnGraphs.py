@@ -24,8 +24,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
 from os import curdir
+from multiprocessing import Pool
+import imp
 
-from nnFuncs import transpose, read_ascii, sendout
+from nnFuncs import transpose, read_ascii
 
 try:
     from matplotlib.backends.backend_agg import FigureCanvasAgg
@@ -41,8 +43,32 @@ class throwgraph():
         self.args = args
         self.kwargs = kwargs
     def __call__(self):
-        self.func(*self.args, **self.kwargs)
-        
+        return self.func(*self.args, **self.kwargs)
+
+def rendergraph(graph):
+    '''Renders a graph object and returns the image file. Used by the
+       processes of the pool in rendergraphs().'''
+    return graph()
+
+def rendergraphs(graphs, processes = 0):
+    '''Renders a list of independent graph objects (throwgraph) in a pool of
+       processes and returns the list of image files. All graphs are drawn
+       with the Agg canvas, so no display is needed in the workers.
+           processes -> Number of processes (0 uses all CPUs, 1 renders
+                        all graphs in the current process)'''
+    # Forked workers deadlock if the pool is created while a module is
+    # still being imported, so it is only used when the import lock is free
+    if processes == 1 or len(graphs) < 2 or imp.lock_held():
+        return [graph() for graph in graphs]
+    if processes < 1:
+        processes = None
+    pool = Pool(processes)
+    try:
+        files = pool.map(rendergraph, graphs, 1)
+    finally:
+        pool.close()
+        pool.join()
+    return files
 
 def varsur2d(varsur, labels, varname = None, outdir = None, dpi = 300):
     '''Outputs one variation surface plot per variable'''
@@ -64,6 +90,7 @@ def varsur2d(varsur, labels, varname = None, outdir = None, dpi = 300):
     outfile = '%s/%s_varsurface.png' % (outdir, varname)
     fig.savefig(outfile, dpi= dpi)
     fig.clf()
+    return outfile
 
 
 def varsur3d(self, varsur, labels, varname = None, outdir = None, dpi = 300):
@@ -90,6 +117,7 @@ def varsur3d(self, varsur, labels, varname = None, outdir = None, dpi = 300):
     outfile = '%s/%s_varsurface.png' % (outdir, varname)
     fig.savefig(outfile, dpi= dpi)
     fig.clf()
+    return outfile
 
 def scatterplot(Xdata, Ydata, varname, outdir = None, dpi = 300, **kwargs):
     '''creates a 2D scatterplot per variable'''
@@ -115,6 +143,7 @@ def scatterplot(Xdata, Ydata, varname, outdir = None, dpi = 300, **kwargs):
     outfile = '%s/%s_PaD.png' %(outdir, varname)
     fig.savefig(outfile, dpi= dpi)
     fig.clf()
+    return outfile
 
 def linesplot(Xdata, Ydata, varname, outdir = None, dpi = 300, **kwargs):
     '''creates a line plot per variable'''
@@ -148,6 +177,23 @@ def linesplot(Xdata, Ydata, varname, outdir = None, dpi = 300, **kwargs):
     outfile = '%s/%s_profile.png' %(outdir, varname)
     fig.savefig(outfile, dpi= dpi)
     fig.clf()
+    return outfile
+
+def decimate(grid, nodata, size):
+    '''Returns a grid as a numpy masked array (nodata is masked) reduced to
+       at most 'size' pixels on the longest side. Each output pixel is the
+       mean of the valid cells of a square block; blocks without valid
+       cells stay masked.'''
+    data = np.ma.masked_equal(np.asarray(grid, dtype=float), nodata)
+    rows, cols = data.shape
+    factor = int(np.ceil(max(rows, cols) / float(size)))
+    if factor <= 1:
+        return data
+    nrows, ncols = -(-rows // factor), -(-cols // factor)
+    padded = np.ma.masked_all((nrows * factor, ncols * factor))
+    padded[:rows, :cols] = data
+    blocks = padded.reshape(nrows, factor, ncols, factor).swapaxes(1, 2)
+    return blocks.reshape(nrows, ncols, factor * factor).mean(axis=2)
 
 def MapsGraph(plotgraph1, plotgraph2, name, 
               outdir = None, nodata = -9999, dpi = 96):
@@ -157,7 +203,8 @@ def MapsGraph(plotgraph1, plotgraph2, name,
        name       -> name for outputfile
        outdir     -> Output folder
        dpi        -> Resolution of output
-       nodata     -> No Data value'''
+       nodata     -> No Data value
+       Rasters larger than the output image are decimated before plotting.'''
     if outdir == None: outdir = curdir
 
     if type(plotgraph1) == str: 
@@ -168,13 +215,17 @@ def MapsGraph(plotgraph1, plotgraph2, name,
     fig  = figure.Figure()
     fig.set_figheight(2)
 
+    # The two maps share the figure width (subplots 121 and 122), so each
+    # one cannot show more pixels than half of it
+    size = int(fig.get_figwidth() * dpi / 2)
+    plotgraph1 = decimate(plotgraph1, nodata, size)
+    plotgraph2 = decimate(plotgraph2, nodata, size)
+
     #plots average model
     canvas = FigureCanvasAgg(fig)
     averageplot = fig.add_subplot(121)
 
-    temp1 = [x for y in plotgraph1 for x in y if x <> nodata]
-    max_value = max(temp1)
-    min_value = min(temp1)
+    min_value = plotgraph1.min()
 
     im = averageplot.imshow(plotgraph1, interpolation='bilinear', 
                            cmap=cm.RdYlGn, vmin=min_value)
@@ -185,9 +236,7 @@ def MapsGraph(plotgraph1, plotgraph2, name,
 
     #plots standard deviation model
 
-    temp2 = [x for y in plotgraph2 for x in y if x <> nodata]
-    max_value = max(temp2)
-    min_value = min(temp2)
+    min_value = plotgraph2.min()
 
     stdplot = fig.add_subplot(122)
 
@@ -201,6 +250,7 @@ def MapsGraph(plotgraph1, plotgraph2, name,
     filename = '%s/%s.png' % (outdir, name)
     fig.savefig(filename, dpi= dpi)
     fig.clf()
+    return filename
 
 def AnalysisGraph(derivatives, plotvalues, name,
                   outdir = None, dpi=96, corr=False, **kwargs): 
@@ -237,15 +287,11 @@ def AnalysisGraph(derivatives, plotvalues, name,
     if corr: corrplot(secondPlot, plotvalues)
     else: rocplot(secondPlot, plotvalues)
 
-    fig.savefig(outdir + "/" + name + ".png", dpi= dpi)
+    filename = outdir + "/" + name + ".png"
+    fig.savefig(filename, dpi= dpi)
     #fig.savefig(outdir + "/" + name + ".svg", dpi= 300)
     fig.clf()
-    
-    #Displays the exact value for each variable importance
-    bar_labels = map(lambda x,y,z: "%s = %.4f (%.4f)" % (x,y,z), dnames, derivatives, dstd)
-    sendout('put', "\nSum of squared partial derivatives and standart deviation by variable")
-    for item in bar_labels:
-        sendout('put', item)
+    return filename
 
 def rocplot(fig, rocvalues):
     roc, pr, aucROC, aucPR = rocvalues
@@ -24,20 +24,37 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
 from os import path, mkdir, remove, listdir
+from random import Random
 import threading
 
 import nnFuncs
+import nnBackends
+import nnOptimizers
 from nnEngine import NN, savenet, loadnet, sigm, dsigm
-from nnRecorder import recorder, htmlreport
-import nnGraphs
+from nnRecorder import recorder, htmlreport, exporttext, logcontents, \
+                       TEXT_BACKEND, STATE
 
 
 ### SOME VARIABLES ###
 CROSS_METHOD = "Cross validation"
 BTSTRP_METHOD = "Bootstrapping"
 RANDOM_METHOD = "Random repetition"
-report = htmlreport()
-EXTRA_MODULES = nnGraphs.EXTRA_MODULES
+GRID_HINT = "grid"
+RANGE_HINT = "range"
+
+# Learning rate range test
+RANGE_LR     = (0.00001, 1.0) # Learning rates of the first and last steps
+RANGE_STEPS  = 30             # Mini-epochs (one learning rate each)
+RANGE_BATCH  = 5              # Mini-epochs to go through all patterns
+RANGE_SMOOTH = 0.7            # Exponential smoothing of the loss
+RANGE_STOP   = 4              # Stops when the loss exceeds 4x the best
+
+# Adaptive ensemble size
+ADAPT_MIN      = 5     # Minimum number of repetitions
+ADAPT_TOL      = 0.005 # Largest change of the averages considered stable
+ADAPT_PATIENCE = 3     # Consecutive stable repetitions needed to stop
+ADAPT_CELLS    = 1000  # Pixels sampled to follow the average map
+ADAPT_SEED     = 0     # Seed of the (fixed) sample of pixels
 
 ### SOME MESSAGES ###
 SUMMARY_MSG   = '\n Summary:' +\
@@ -46,6 +63,23 @@ SUMMARY_MSG   = '\n Summary:' +\
                 '\n   Neural Network: %s (%s momentum and %s learning rate)' +\
                 '\n   Iterations = %s (%s internal and %s reports)' 
 SUMMARYAUC_MSG= '\n   AUC threshold: %s for train and %s for test'
+SUMMARYOPT_MSG= '\n   Optimizer: %s'
+SUMMARYWRM_MSG= '\n   Warm start: %s trained networks from %s'
+SUMMARYAPP_MSG= '\n   Appending to the %s repetitions of the output folder'
+APPENDNONE_MSG= "\nThere is no finished run with %s logs to append to in %s."
+APPENDVARS_MSG= "\nThe run in %s has the variables %s and cannot be " +\
+                "appended with the variables %s."
+APPENDNET_MSG = "\nThe run in %s has networks with the scheme %s and " +\
+                "cannot be appended with the network %s."
+APPENDINT_MSG = "\nThe run in %s has no interaction surfaces for all its " +\
+                "repetitions. Append without interactions."
+SUMMARYADP_MSG= '\n   Adaptive size: %s to %s repetitions (stops after %s ' +\
+                'changes below %s)'
+ADAPTCHG_MSG  = "Change of the averages: %.5f map | %.5f variable importance"
+ADAPTSTOP_MSG = "\nThe averages are stable: stopping with %s repetitions."
+WARMNONE_MSG  = "\nNo trained networks (.net files) found for warm start in %s"
+WARMSHAPE_MSG = "\nThe network %s has the scheme %s and cannot warm start " +\
+                "the network %s. Check the hidden layers and the variables."
 CHOSEN_ITER   = "Iteration chosen: %s"
 SOME_FAIL_AUC = "\nNot all the models could meet the AUC theshold. Those " +\
                 "models will be removed from the final results. To try to " +\
@@ -69,12 +103,18 @@ KFOLDSMT_MSG  = "K-fold Cross Validation"
 BTSRTP_MSG    = "Bootstraps (Subsets are %s%% of the original size)"
 RAND_MSG      = "Random subsampling"
 SENSIT_MSG    = "Sensitivity analysis for model %s"
+INTERACT_MSG  = "Interaction surfaces for model %s"
 FINALMAPS_MSG = "\nPress Results to produce the final maps."
 NETAUCINF_MSG = "Net %3s -> Train: error - %2.3f AUC - %2.3f | Test: error - %2.3f AUC - %2.3f"
 NETINF_MSG    = "Net %3s -> Train: error - %2.3f | Test: error - %2.3f"
 PREPRSLT_MSG  = '\nPreparing final results...'
 READPROJ_MSG  = "Reading project rasters..."
 HINTS_MSG     = "\nHints for learning rate value:"
+RANGEHINT_MSG = "\nLearning rate range test (loss descent by learning rate):"
+HINTLR_MSG    = "\nSuggested learning rate: %.5f"
+HINTSGD_MSG   = "\nThe learning rate hint is given for the sgd optimizer " +\
+                "(%s ignores the learning rate or only uses it as the " +\
+                "initial step)."
 BACKUP_MSG    = 'Backup of old data in output folder done!'
 MODELNO_MSG   = "\nModel no. %s"
 READDONE_MSG  = "\nReading files done!"
@@ -82,8 +122,17 @@ BURNIN_MSG    = "Burn in phase..."
 CALCVARS_MSG  = "Creating plots for %s"
 CALCAUC_MSG   = "Calculating ROC, PR and AUCs for final averaged model"
 SHOWMAPS_MSG  = "Opening maps window"
+RENDER_MSG    = "Rendering %s graphs"
+VARIMP_MSG    = "\nSum of squared partial derivatives and standart deviation by variable"
+VARIMPVAL_MSG = "%s = %.4f (%.4f)"
+BACKEND_MSG   = "Compute backend: %s"
+BATCHED_MSG   = "Training the %s repetitions together (batched)..."
+NOBATCH_MSG   = "Batched training needs numpy, a sigm or tanh network " +\
+                "and the sgd optimizer. Training repetitions one by one."
+ADAPTBATCH_MSG= "The adaptive ensemble size trains the repetitions one by one."
 COMPMODEL_MSG = "Computing model %s of %s (%s fail)"
 PROJECT_MSG   = "Projecting model with network %s"
+EXPORT_MSG    = "%s results logs exported to text in %s"
 NO_MOD_MSG    = "\nNo extra modules found. Please install the modules to " +\
                 "create and display the images or check the text files of " +\
                 "the results in the results folder."
@@ -97,6 +146,28 @@ def filematch(pathname, ext, fullpath=True):
         match = [pathname + path.sep + x for x in match]
     return match          
 
+def sserror(output, targets):
+    '''Sum of squared errors of the first output (as NN.neterror).'''
+    return 0.5 * sum([(o[0] - t[0])**2 for o, t in zip(output, targets)])
+
+def netrep(netfile):
+    '''Repetition number of a saved network file (net<iter>_rep<rep>.net)
+       or 0 if the name has no repetition.'''
+    try:
+        return int(path.basename(netfile)[:-4].split('_rep')[-1])
+    except ValueError:
+        return 0
+
+def warmfiles(warmstart):
+    '''Saved networks to warm start from an output folder (sorted by
+       repetition) or a comma separated list of .net files.'''
+    if path.isdir(warmstart):
+        files = filematch(warmstart, 'net')
+        files.sort(key=netrep)
+    else:
+        files = [x.strip() for x in warmstart.split(',') if x.strip()]
+    return files
+
 def varname(rasterfile):
     '''Extracts the name of a file without extension
        from a full path string'''
@@ -109,6 +180,14 @@ class Manager():
         self.conn = conn
         nnFuncs.conn = conn
 
+    def selectbackend(self, backend, scheme):
+        '''Selects the compute backend by name or, if 'auto', the fastest
+           for the network scheme (see nnBackends).'''
+        name = nnBackends.select(backend, scheme).name
+        if backend == nnBackends.AUTO:
+            name += ' (%s)' % backend
+        self.conn.display_msg(BACKEND_MSG % name)
+
     def read_all(self, dir_rasters, file_data, percentage, out_dir = None,
                  repetitions = None, method = None, apratio = 1, **kwargs):
         '''Reads all rasters from raster directory and extracts data from text
@@ -140,14 +219,17 @@ class Manager():
             standard = True
             mkdir(std_dir)
             
-        rasters, raster_values, rasterstats, header = self.read_rasters(dir_rasters, standard)
+        stage = self.conn.monitor.stage
+        with stage('read'):
+            rasters, raster_values, rasterstats, header = self.read_rasters(dir_rasters, standard)
     
         self.conn.display_msg(READ_MSG)
 
         # Initializes nnFuncs.spatial_functions with data from the first raster
         spfuncs = nnFuncs.spatial_functions(*header)
 
-        allData, allVariables, DataCoords = spfuncs.ExtractValues(file_data, raster_values, rasters, apratio, out_dir)
+        with stage('extract'):
+            allData, allVariables, DataCoords = spfuncs.ExtractValues(file_data, raster_values, rasters, apratio, out_dir)
 
         self.conn.abundvar = spfuncs.abundance
         self.totaldata = (allData, allVariables, DataCoords)
@@ -224,7 +306,12 @@ class Manager():
 
     def model(self,  hiddenlyrs, lrate, momentum, iterinter, out_dir, 
               method = RANDOM_METHOD, repetitions = 10, aucfilter = False,
-              percentage = 50, iterreport = 1, **kwargs):
+              percentage = 50, iterreport = 1, interactions = False,
+              logformat = TEXT_BACKEND, backend = nnBackends.AUTO,
+              batched = False, optimizer = nnOptimizers.SGD,
+              warmstart = None, finetune = 0, append = False,
+              adaptive = False, minreps = ADAPT_MIN, tolerance = ADAPT_TOL,
+              patience = ADAPT_PATIENCE, **kwargs):
         '''Neural Networks with repetition
 
             hiddenlyrs   - Number of Hidden Layers in the network
@@ -238,6 +325,33 @@ class Manager():
                            False for Neural Networks without AUC calculation
             percentage   - percentage of training and test data
             iterreport   - No of AUC reports
+            interactions - True to compute the two-way interaction surfaces
+                           for all pairs of variables
+            logformat    - Backend of the results logs ('text' or 'binary')
+            backend      - Compute backend name or 'auto' (see nnBackends)
+            batched      - True to train all repetitions together as one
+                           stack of networks (needs numpy)
+            optimizer    - 'sgd' (online training with learning rate and
+                           momentum) or a full-batch optimizer of
+                           nnOptimizers ('rprop' or 'adam')
+            warmstart    - Output folder of a previous run or comma separated
+                           .net files with the initial weights of the
+                           repetitions (matched in order of repetition and
+                           reused cyclically); no burn in is done
+            finetune     - No of AUC reports when warm starting (0 keeps
+                           iterreport)
+            append       - True to add the repetitions to a finished run in
+                           out_dir (logs, numbering and running statistics
+                           are continued)
+            adaptive     - True to stop adding repetitions (repetitions is
+                           the maximum) when the averages of the map and of
+                           the variable importance are stable
+            minreps      - Minimum number of repetitions when adaptive
+            tolerance    - Largest change of the averages by a repetition
+                           considered stable (mean absolute change of a
+                           sample of pixels and largest change of the
+                           variable importance relative to its total)
+            patience     - Consecutive stable repetitions needed to stop
 
             kwargs:
             auctrain     - Value of AUC threshold for train data
@@ -251,27 +365,8 @@ class Manager():
         ninputs = len(rasters)
         modelFiles = self.modelFiles = []
         showmsg = self.conn.display_msg
-
-        #Initiate graphs and results logs
-        varprof     = nnFuncs.profiler(self.rasterstats, rasters)
-        profile_log = recorder(out_dir, 'profile', rasters)
-        varsur_log  = recorder(out_dir, 'varsurface', rasters)
-        pderiv_log  = recorder(out_dir, 'PaD', rasters)
-        result_log  = recorder(out_dir, 'results_data')
-
-        #Add headers to logs
-        result_log.addheader(rasters + ['Chosen_net', 'TrainError', 'TrainAuc', 'TestError', 'TestAUC'])
-        headers_pd = nnFuncs.transpose(self.totaldata[1])
-        for r_index in xrange(ninputs):
-            raster = rasters[r_index]
-            header = varprof.rvars[raster]
-            profile_log.addheader(header, raster)
-            varsur_log.addheader(header, raster)
-            header = nnFuncs.unstd(headers_pd[r_index], self.rasterstats[raster])
-            pderiv_log.addheader(header, raster, headertxt='Variables')
-
-        #Cleanup
-        del header, headers_pd, r_index         
+        stage = self.conn.monitor.stage
+        counted = self.conn.monitor.counted
 
         ### Creates the network ###
         NeuralShape = []
@@ -280,9 +375,84 @@ class Manager():
             for item in  hiddenlyrs.split(','): NeuralShape.append(int(item))
         NeuralShape.append(1) # One output only
 
+        self.selectbackend(backend, NeuralShape)
         net = NN(NeuralShape, iterations=iterinter, LR=lrate, momentum=momentum, 
                  verbosity=0)
-       
+        net.optimizer = optimizer
+
+        #Trained networks to warm start the repetitions (checked before the
+        #logs are opened, which would change those of the output folder)
+        warmnets = []
+        if warmstart:
+            for netfile in warmfiles(warmstart):
+                warmnet = loadnet(netfile)
+                if warmnet.scheme <> NeuralShape:
+                    showmsg(WARMSHAPE_MSG % (netfile, warmnet.scheme, NeuralShape))
+                    self.conn.modify_button('normal', ['READ', 'RUN', 'HINT', 'METHOD', 'OPTION'])
+                    return
+                warmnets.append(warmnet)
+            if not warmnets:
+                showmsg(WARMNONE_MSG % warmstart)
+                self.conn.modify_button('normal', ['READ', 'RUN', 'HINT', 'METHOD', 'OPTION'])
+                return
+            if finetune:
+                iterreport = finetune
+
+        varprof = nnFuncs.profiler(self.rasterstats, rasters)
+        if append:
+            msg = self.appendcheck(out_dir, NeuralShape, logformat,
+                                   interactions and varprof.pairs())
+            if msg:
+                showmsg(msg)
+                self.conn.modify_button('normal', ['READ', 'RUN', 'HINT', 'METHOD', 'OPTION'])
+                return
+
+        #Initiate graphs and results logs
+        profile_log = recorder(out_dir, 'profile', rasters, backend=logformat,
+                               append=append)
+        varsur_log  = recorder(out_dir, 'varsurface', rasters,
+                               backend=logformat, append=append)
+        pderiv_log  = recorder(out_dir, 'PaD', rasters, backend=logformat,
+                               append=append)
+        result_log  = recorder(out_dir, 'results_data', backend=logformat,
+                               append=append)
+        if interactions:
+            pairs = varprof.pairs()
+            inter_log = recorder(out_dir, 'interaction',
+                                 [nnFuncs.pairname(*x) for x in pairs],
+                                 backend=logformat, append=append)
+
+        #Repetitions already in the output folder are kept and numbered first
+        self.append, self.previous = append, 0
+        if append:
+            names = result_log.getnames(None)
+            previous = [int(x) for x in names if str(x).isdigit()]
+            if previous:
+                self.previous = max(previous)
+            for rep in sorted(previous):
+                file_model = '%s/Model_%s.txt' % (out_dir, rep)
+                if path.isfile(file_model):
+                    modelFiles.append(file_model)
+        else:
+            #Add headers to logs
+            result_log.addheader(rasters + ['Chosen_net', 'TrainError', 'TrainAuc', 'TestError', 'TestAUC'])
+            headers_pd = nnFuncs.transpose(self.totaldata[1])
+            for r_index in xrange(ninputs):
+                raster = rasters[r_index]
+                header = varprof.rvars[raster]
+                profile_log.addheader(header, raster)
+                varsur_log.addheader(header, raster)
+                header = nnFuncs.unstd(headers_pd[r_index], self.rasterstats[raster])
+                pderiv_log.addheader(header, raster, headertxt='Variables')
+            if interactions:
+                for raster1, raster2 in pairs:
+                    inter_log.addheader(varprof.rvars[raster1],
+                                        nnFuncs.pairname(raster1, raster2))
+
+            #Cleanup
+            del header, headers_pd, r_index
+        previous = self.previous
+
         ### Creates repeated networks to produce n models ###
         allData, allVariables, DataCoords = self.totaldata
         subsets = nnFuncs.subsets(allData, allVariables, DataCoords)
@@ -304,85 +474,191 @@ class Manager():
         if aucfilter:
             auctrain, auctest = kwargs['auctrain'], kwargs['auctest']
             msg += SUMMARYAUC_MSG % (auctrain, auctest)
+        if optimizer <> nnOptimizers.SGD:
+            msg += SUMMARYOPT_MSG % optimizer
+        if warmnets:
+            msg += SUMMARYWRM_MSG % (len(warmnets), warmstart)
+        if append:
+            msg += SUMMARYAPP_MSG % previous
+        if adaptive:
+            msg += SUMMARYADP_MSG % (min(minreps, repetitions), repetitions,
+                                     patience, tolerance)
         showmsg(msg)
 
         #Keeps track of the networks repetitions that did not achieve proposed AUC values
         self.failed = 0
-        
-        for self.rep in xrange(1, repetitions + 1):
-            self.conn.display_msg(MODELNO_MSG % (self.rep))
-
-            #show progress bar
-            msg = COMPMODEL_MSG % (self.rep, repetitions, self.failed)
-            self.conn.progress_bar(self.rep-1, repetitions, msg=msg)
-
-            targets, inputs, targetsTest, inputsTest = repmethod.next()
-            #Prepares the net with random weights and burnin
-            net.rndWeights()
-            if 'burnin' in kwargs:
-                net = self.burnin(net, inputs, targets, kwargs['burnin'])
-
-            if aucfilter:
-                self.repnet(net, inputs, targets, inputsTest, targetsTest,
-                            iterreport, auctrain, auctest)
-                if len(self.values) == 0:
-                    self.failed += 1
-                    continue
-                    #TODO: Should update the progress bar!
 
-            else:
-                self.repnet(net, inputs, targets, inputsTest, 
-                            targetsTest, iterreport)
-
-            self.bestnet()
-            self.writeChosenNet(out_dir)
+        if adaptive:
+            #Follows the averages on a fixed sample of pixels with data
+            spfuncs = self.spfuncs
+            cells = [(row, col) for row in xrange(spfuncs.nrows)
+                     for col in xrange(spfuncs.ncols)
+                     if spfuncs.nodata_list[row][col] <> 1]
+            cells = Random(ADAPT_SEED).sample(cells, min(ADAPT_CELLS, len(cells)))
+            cells = [[raster_values[rst][row][col] for rst in rasters]
+                     for row, col in cells]
+            tracker = nnFuncs.convergence(cells, tolerance, patience, minreps)
+            if batched:
+                showmsg(ADAPTBATCH_MSG)
+                batched = False
+        if batched and (not nnBackends.NUMPY or
+                        net.func.__name__ not in nnBackends.NP_FUNCS or
+                        optimizer <> nnOptimizers.SGD):
+            showmsg(NOBATCH_MSG)
+            batched = False
+        if batched:
+            #Subsets and initial weights are drawn in the same sequence as
+            #one by one, then all repetitions are trained together (each
+            #starting without momentum, unlike one by one after the first)
+            subsets, nets = [], []
+            for rep in xrange(repetitions):
+                subsets.append(repmethod.next())
+                nets.append(NN(NeuralShape, iterations=iterinter, LR=lrate,
+                               momentum=momentum, verbosity=0))
+                if warmnets:
+                    self.warmweights(nets[-1], warmnets[rep % len(warmnets)])
+                else:
+                    nets[-1].rndWeights()
+            repmethod = iter(subsets)
+            showmsg(BATCHED_MSG % repetitions)
+            with stage('train', batched=True):
+                if not aucfilter:
+                    auctrain = auctest = None
+                burnin = 0 if warmnets else kwargs.get('burnin', 0)
+                trained = self.batchrepnet(nets, subsets, iterreport, auctrain,
+                                           auctest, burnin)
+
+        self.rep = previous
+        logs = [profile_log, varsur_log, pderiv_log, result_log]
+        if interactions:
+            logs.append(inter_log)
+        try:
+            for self.rep in xrange(previous + 1, previous + repetitions + 1):
+                with self.conn.monitor.span('repetition %s' % self.rep):
+                    self.conn.display_msg(MODELNO_MSG % (self.rep))
+
+                    #show progress bar
+                    msg = COMPMODEL_MSG % (self.rep - previous, repetitions, self.failed)
+                    self.conn.progress_bar(self.rep - previous - 1, repetitions, msg=msg)
+
+                    targets, inputs, targetsTest, inputsTest = repmethod.next()
+                    if batched:
+                        self.values, self.nets, messages = trained[self.rep - previous - 1]
+                        for msg in messages:
+                            showmsg(msg)
+                    else:
+                        with stage('train'):
+                            #Prepares the net with random weights and burnin
+                            #(or with the weights of a trained net)
+                            if warmnets:
+                                warmnet = warmnets[(self.rep - previous - 1) % len(warmnets)]
+                                self.warmweights(net, warmnet)
+                            else:
+                                net.rndWeights()
+                                if 'burnin' in kwargs:
+                                    net = self.burnin(net, inputs, targets, kwargs['burnin'])
+
+                            if aucfilter:
+                                self.repnet(net, inputs, targets, inputsTest, targetsTest,
+                                            iterreport, auctrain, auctest)
+                            else:
+                                self.repnet(net, inputs, targets, inputsTest, 
+                                            targetsTest, iterreport)
+
+                    if aucfilter and len(self.values) == 0:
+                        self.failed += 1
+                        continue
+                        #TODO: Should update the progress bar!
+
+                    self.bestnet()
+                    self.writeChosenNet(out_dir)
           
-            net, details = self.chosennet
-
-            #Sensitivity analysis of the network
-            self.conn.display_msg(SENSIT_MSG % (self.rep))
-            VarSurfaces, Profiles = {}, {}
-            pcounter = 0
-            ptotal = ninputs * 2 + len(self.totaldata[1])
-            for rst in rasters:
-                self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
-                VarSurfaces[rst] = varprof.varsurface(rst, net.testnet)
-                Profiles[rst] = varprof.onewayprofile(rst, net.testnet)
-                pcounter += 1
-            deriv = []
-            for line in self.totaldata[1]:
-                self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
-                deriv.append(nnFuncs.reducelist(net.pderiv(line)))
-                pcounter += 1
-
-            #Write data to log and calculate variable importance per repetition
-            tderiv = nnFuncs.transpose(deriv)
-            varimp = []
-            for r_index in xrange(ninputs):
-                self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
-                pderiv_log.write(tderiv[r_index], rasters[r_index], str(self.rep))
-                varimp.append(sum([x**2 for x in tderiv[r_index]]))
-                pcounter += 1
-            result_log.write(varimp + details, name=str(self.rep))
-            profile_log.write_levels(Profiles, str(self.rep))
-            varsur_log.write_levels(VarSurfaces, str(self.rep))
-
-            #Save model
-            file_model = '%s/Model_%s.txt' % (out_dir, self.rep)
-            modelFiles.append(file_model)
-            self.spfuncs.rastercalc(net.testnet, raster_values, file_model, rasters)
+                    net, details = self.chosennet
+
+                    #Sensitivity analysis of the network
+                    self.conn.display_msg(SENSIT_MSG % (self.rep))
+                    VarSurfaces, Profiles = {}, {}
+                    pcounter = 0
+                    ptotal = ninputs * 2 + len(self.totaldata[1])
+                    with stage('sensitivity'):
+                        predict = counted('forward passes', net.predict)
+                        for rst in rasters:
+                            self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
+                            VarSurfaces[rst] = varprof.varsurface(rst, predict)
+                            Profiles[rst] = varprof.onewayprofile(rst, predict)
+                            pcounter += 1
+                        if interactions:
+                            self.conn.display_msg(INTERACT_MSG % (self.rep))
+                            Interactions = varprof.interactions(predict)
+                    deriv = []
+                    with stage('PaD'):
+                        pderiv = counted('forward passes', net.pderiv)
+                        for line in self.totaldata[1]:
+                            self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
+                            deriv.append(nnFuncs.reducelist(pderiv(line)))
+                            pcounter += 1
+
+                    #Write data to log and calculate variable importance per repetition
+                    with stage('write logs'):
+                        tderiv = nnFuncs.transpose(deriv)
+                        varimp = []
+                        for r_index in xrange(ninputs):
+                            self.conn.progress_bar(pcounter, ptotal, color='darkgreen')
+                            pderiv_log.write(tderiv[r_index], rasters[r_index], str(self.rep))
+                            varimp.append(sum([x**2 for x in tderiv[r_index]]))
+                            pcounter += 1
+                        result_log.write(varimp + details, name=str(self.rep))
+                        profile_log.write_levels(Profiles, str(self.rep))
+                        varsur_log.write_levels(VarSurfaces, str(self.rep))
+                        if interactions:
+                            inter_log.write_levels(Interactions, str(self.rep))
+
+                    #Save model
+                    file_model = '%s/Model_%s.txt' % (out_dir, self.rep)
+                    modelFiles.append(file_model)
+                    with stage('projection'):
+                        self.spfuncs.rastercalc(counted('forward passes', net.predict),
+                                                raster_values, file_model, rasters,
+                                                batch=True)
+
+                    if adaptive:
+                        stable = tracker.add(counted('forward passes', net.predict),
+                                             varimp)
+                        if tracker.changes:
+                            showmsg(ADAPTCHG_MSG % tracker.changes)
+                        if stable:
+                            showmsg(ADAPTSTOP_MSG % (self.rep - previous))
+                            break
+        finally:
+            #Writes what is left in the logs buffers, also when a repetition
+            #fails, so the results of the previous ones are kept
+            for log in logs:
+                log.flush()
+
+        #Repetitions done (less than repetitions if adaptive)
+        self.done = self.rep - previous
 
         #Check if there are enough models
-        if self._checkModelErrors(repetitions):
+        if self._checkModelErrors(self.done):
             self.conn.modify_button('normal', ['READ', 'RUN', 'HINT', 'METHOD', 'OPTION'])
 
         else:
+            # Saves the running statistics to append repetitions later
+            for log in [profile_log, varsur_log, pderiv_log, result_log]:
+                log.savestate()
+            if interactions:
+                inter_log.savestate()
+
             # Finalize the variables logs
             for rst in rasters:
                 profile_log.finalize(rst)
                 varsur_log.finalize(rst)
                 pderiv_log.finalize(rst)
             result_log.finalize()
+            if interactions:
+                for raster1, raster2 in pairs:
+                    inter_log.finalize(nnFuncs.pairname(raster1, raster2))
+                self.ilog = inter_log
 
             self.plog = profile_log
             self.vlog = varsur_log
@@ -413,6 +689,34 @@ class Manager():
             return(True)
 
 
+    def appendcheck(self, out_dir, scheme, logformat, pairs = None):
+        '''Checks that the run in out_dir can be continued with the
+           rasters, the network scheme and the interaction pairs given.
+           Returns the message of the first mismatch (None if there is
+           none). The logs are only read.'''
+        header, names = logcontents(out_dir, 'results_data', None, logformat)
+        if header == None or not names:
+            return APPENDNONE_MSG % (logformat, out_dir)
+        variables = header.split(';')[1:-5]
+        if variables <> self.rasters:
+            return APPENDVARS_MSG % (out_dir, variables, self.rasters)
+        for netfile in filematch(out_dir, 'net'):
+            netscheme = loadnet(netfile).scheme
+            if netscheme <> scheme:
+                return APPENDNET_MSG % (out_dir, netscheme, scheme)
+        for raster1, raster2 in pairs or []:
+            level = nnFuncs.pairname(raster1, raster2)
+            if logcontents(out_dir, 'interaction', level, logformat)[1] <> names:
+                return APPENDINT_MSG % out_dir
+
+    def warmweights(self, net, warmnet):
+        '''Starts the net with a copy of the weights of a trained network
+           (previous changes and optimizer state are reset).'''
+        net.weights = [[row[:] for row in layer] for layer in warmnet.weights]
+        net.changes = [[[0.0] * len(row) for row in layer]
+                       for layer in net.weights]
+        net.optstate = None
+
     def burnin(self, net, inputs, targets, burnin):
         '''trains a network for a Burnin Period to adujst the weights'''
         #TODO Adjust to internal iterations
@@ -422,6 +726,7 @@ class Manager():
         self.conn.display_msg(BURNIN_MSG)
         for i in xrange(burnin):
             net.trainnet(0)
+        self.conn.monitor.count('training patterns', len(inputs) * burnin)
         net.iterations = iterations
         return net
 
@@ -430,49 +735,98 @@ class Manager():
         '''Trains and tests Neural Networks based on the number of internal
            iterations and AUC/error reports (when needed)'''
         values, nets = [], []
-        calculateAUC = False
-        if auctrain <> None and auctest <> None: calculateAUC = True
-
-        if calculateAUC:
-            # Get a plain list of real values for roc
-            real = [x for line in targets for x in line]
-            realTest =[x for line in targetsTest for x in line]
 
         for i in xrange(iterreport):
             net.loaddata(inputs, targets)
             net.trainnet(0)
-
-            output = net.testnet(inputs, 0)
-            outputTest = net.testnet(inputsTest, 0)
-
-            error = net.neterror(inputs, targets)[0]
-            errorTest = net.neterror(inputsTest, targetsTest)[0]
-            if calculateAUC:
-                #Get plain list of predicted values for AUC
-                pred = [x for line in output for x in line]                    
-                predTest = [x for line in outputTest for x in line]
-               
-                roc = nnFuncs.roc(real, pred)
-                auc = roc.auc()
-
-                rocTest = nnFuncs.roc(realTest, predTest)
-                aucTest = rocTest.auc()
-
-                if auc >= auctrain and aucTest >= auctest:
-                    values.append([i, error, auc, errorTest, aucTest])
-                txt = NETAUCINF_MSG % (i, error, auc, errorTest, aucTest)
+            self.conn.monitor.count('training patterns',
+                                    len(inputs) * net.iterations)
+
+            with self.conn.monitor.stage('evaluate', iteration=i):
+                output = net.testnet(inputs, 0)
+                outputTest = net.testnet(inputsTest, 0)
+
+                error = net.neterror(inputs, targets)[0]
+                errorTest = net.neterror(inputsTest, targetsTest)[0]
+                value, txt = self.reportnet(i, error, errorTest, targets,
+                                            output, targetsTest, outputTest,
+                                            auctrain, auctest)
+                if value:
+                    values.append(value)
                 self.conn.display_msg(txt)
 
-            else:
-                values.append([i, error, 0, errorTest, 0])
-                txt = NETINF_MSG % (i, error, errorTest)
-                self.conn.display_msg(txt)
-            
             nets.append(net)
 
         self.values = values
         self.nets   = nets
 
+    def reportnet(self, i, error, errorTest, targets, output, targetsTest,
+                  outputTest, auctrain = None, auctest = None):
+        '''Report values of a network at iteration i and its message. With
+           AUC thresholds the values are None if they are not met.'''
+        if auctrain <> None and auctest <> None:
+            # Get plain lists of real and predicted values for roc
+            real = [x for line in targets for x in line]
+            realTest = [x for line in targetsTest for x in line]
+            pred = [x for line in output for x in line]
+            predTest = [x for line in outputTest for x in line]
+
+            auc = nnFuncs.roc(real, pred).auc()
+            aucTest = nnFuncs.roc(realTest, predTest).auc()
+
+            value = None
+            if auc >= auctrain and aucTest >= auctest:
+                value = [i, error, auc, errorTest, aucTest]
+            return value, NETAUCINF_MSG % (i, error, auc, errorTest, aucTest)
+
+        return [i, error, 0, errorTest, 0], NETINF_MSG % (i, error, errorTest)
+
+    def batchrepnet(self, nets, subsets, iterreport = 1, auctrain = None,
+                    auctest = None, burnin = 0):
+        '''Trains and tests all repetitions together as a stack of networks
+           (see nnBackends.netstack), with the same reports as repnet().
+           Returns the report values, networks and messages of each
+           repetition.'''
+        stack = nnBackends.netstack(nets)
+        targets, inputs, targetsTest, inputsTest = zip(*subsets)
+        stack.loaddata(inputs, targets)
+        npatterns = sum([len(x) for x in inputs])
+        iterations = nets[0].iterations
+        messages = [[] for net in nets]
+        values = [[] for net in nets]
+
+        if burnin:
+            for msg in messages:
+                msg.append(BURNIN_MSG)
+            stack.train(burnin)
+            self.conn.monitor.count('training patterns', npatterns * burnin)
+
+        for i in xrange(iterreport):
+            self.conn.progress_bar(i, iterreport)
+            stack.train(iterations)
+            self.conn.monitor.count('training patterns', npatterns * iterations)
+
+            with self.conn.monitor.stage('evaluate', iteration=i):
+                output = stack.predict(inputs)
+                outputTest = stack.predict(inputsTest)
+                for r in xrange(len(nets)):
+                    error = sserror(output[r], targets[r])
+                    errorTest = sserror(outputTest[r], targetsTest[r])
+                    value, txt = self.reportnet(i, error, errorTest,
+                                                targets[r], output[r],
+                                                targetsTest[r], outputTest[r],
+                                                auctrain, auctest)
+                    if value:
+                        values[r].append(value)
+                    messages[r].append(txt)
+
+        # Leaves each network as repnet() does (test data loaded)
+        stack.unstack()
+        for r, net in enumerate(nets):
+            net.neterror(inputsTest[r], targetsTest[r])
+        return [(values[r], [nets[r]] * iterreport, messages[r])
+                for r in xrange(len(nets))]
+
     def bestnet(self):
         ''' Finds best net and deletes the others. The best net is 
             defined by the sorting value (test error).'''
@@ -503,13 +857,15 @@ class Manager():
         self.conn.display_msg(PREPRSLT_MSG)
         self.conn.modify_button('disable', 'all')
 
-        if EXTRA_MODULES == False:
+        # The plotting stack (matplotlib) is only imported when needed
+        import nnGraphs
+        if nnGraphs.EXTRA_MODULES == False:
             msg = NO_MOD_MSG
             self.conn.display_msg(msg)
             self.conn.modify_button('normal', 'all')
             return
         
-        graphs       = None #nnFuncs.graphs()
+        graphs       = []
         ninputs      = len(self.rasters)
         raster_names = self.rasters
         plog         = self.plog
@@ -517,7 +873,7 @@ class Manager():
         dlog         = self.dlog
         rlog         = self.rlog
         spfuncs      = self.spfuncs
-        ptotal       = ninputs + 2
+        ptotal       = ninputs + 3
         pcounter     = 0
 
         #Creates variable plots
@@ -529,57 +885,71 @@ class Manager():
 
             varsur = nnGraphs.throwgraph(nnGraphs.varsur2d, varsur,
                                          header, rst, out_dir)
-            self.conn.processGraph(varsur)
+            graphs.append(varsur)
 
             sctplot = nnGraphs.throwgraph(nnGraphs.scatterplot,
                                           dlog.getheader(rst),
                                           dlog.getmem(rst)[0],
                                           rst, out_dir,
                                           std=dlog.getmem(rst)[1])
-            self.conn.processGraph(sctplot)
+            graphs.append(sctplot)
 
             lnplot = nnGraphs.throwgraph(nnGraphs.linesplot, 
                                          plog.getheader(rst), 
                                          plog.getmem(rst)[0], 
                                          rst, out_dir, 
                                          std=plog.getmem(rst)[1])
-            self.conn.processGraph(lnplot)
+            graphs.append(lnplot)
             pcounter += 1
 
         # Calculate ROC/PR & AUC for the average model with total data
         self.conn.progress_bar(pcounter, ptotal, msg=CALCAUC_MSG)
-        average, std = spfuncs.modelstats(self.modelFiles, out_dir)
-        real = [x for line in self.totaldata[0] for x in line]
-        pred = spfuncs.ExtractValues(self.totaldata[2], {'average':average})
-
-        if self.conn.abundvar:
-            plotvalues = [real, pred]
-        else:
-            roc = nnFuncs.roc(real, pred)
-            plotvalues = roc.process_all()
+        with self.conn.monitor.stage('stats'):
+            average, std = spfuncs.modelstats(self.modelFiles, out_dir,
+                                              statefile=out_dir + '/' + STATE,
+                                              append=self.append)
+            real = [x for line in self.totaldata[0] for x in line]
+            pred = spfuncs.ExtractValues(self.totaldata[2], {'average':average})
+
+            if self.conn.abundvar:
+                plotvalues = [real, pred]
+            else:
+                roc = nnFuncs.roc(real, pred)
+                plotvalues = roc.process_all()
         pcounter += 1
-        # Show maps
-        self.conn.progress_bar(pcounter, ptotal, msg=SHOWMAPS_MSG)
         Maps = nnGraphs.throwgraph(nnGraphs.MapsGraph, average, std, 
                                    "Results_map", out_dir, spfuncs.nodata)
-        self.conn.processGraph(Maps)
+        graphs.append(Maps)
 
-        Analysis = nnGraphs.throwgraph(nnGraphs.AnalysisGraph, 
-                                       rlog.getavg()[:ninputs],
+        varimp, varstd = rlog.getavg()[:ninputs], rlog.getstd()[:ninputs]
+        Analysis = nnGraphs.throwgraph(nnGraphs.AnalysisGraph, varimp,
                                        plotvalues, "Results_variables_roc",
                                        out_dir, dnames = raster_names, 
-                                       dstd=rlog.getstd()[:ninputs], 
+                                       dstd=varstd, 
                                        corr=self.conn.abundvar)
-        self.conn.processGraph(Analysis)
+        graphs.append(Analysis)
 
+        # All graphs are independent and rendered together
+        self.conn.progress_bar(pcounter, ptotal, msg=RENDER_MSG % len(graphs))
+        with self.conn.monitor.stage('graphs'):
+            self.conn.processGraphs(graphs)
+        pcounter += 1
+
+        #Displays the exact value for each variable importance
+        self.conn.display_msg(VARIMP_MSG)
+        for item in zip(raster_names, varimp, varstd):
+            self.conn.display_msg(VARIMPVAL_MSG % item)
 
+        # Show maps
+        self.conn.progress_bar(pcounter, ptotal, msg=SHOWMAPS_MSG)
         self.conn.showResults(["Results_map.png","Results_variables_roc.png"])
         
         pcounter +=1
 
         #Make html report
+        report = htmlreport()
         kwargs['scheme'] = '%s,%s,%s' % (ninputs, kwargs['hiddenlyrs'], 1)
-        kwargs['repetitions'] = repetitions
+        kwargs['repetitions'] = self.done + self.previous
         kwargs['out_dir'] = out_dir
         report.summary(kwargs)
         report.model()
@@ -589,7 +959,8 @@ class Manager():
         self.conn.progress_bar(pcounter, ptotal)
         self.conn.modify_button('normal', 'all')
 
-    def project(self, out_dir, project_dir, **kwargs):
+    def project(self, out_dir, project_dir, backend = nnBackends.AUTO,
+                **kwargs):
         '''Projects all saved models by loading the trained neural network
            to the new raster set found in the \'project_dir\'
            Standardization of projection rasters is processed with the values
@@ -604,7 +975,9 @@ class Manager():
         prj_raster_values = {}
         prjFiles = []
 
-        rasters_prj, raster_values_prj, rasterstats_prj, header_prj = self.read_rasters(project_dir, self.rasterstats)
+        stage = self.conn.monitor.stage
+        with stage('read'):
+            rasters_prj, raster_values_prj, rasterstats_prj, header_prj = self.read_rasters(project_dir, self.rasterstats)
         spfuncs_prj = nnFuncs.spatial_functions(*header_prj)
         spfuncs_prj.create_nodata_list(raster_values_prj[rasters_prj[0]])
 
@@ -614,28 +987,52 @@ class Manager():
             msg = PROJECT_MSG % rep.split('rep')[-1]
             self.conn.progress_bar(ncounter, N, msg=msg)
             net = loadnet(network)
+            if ncounter == 1:
+                self.selectbackend(backend, net.scheme)
             file_prj = '%s/Project%s.txt' % (out_dir, rep)
             prjFiles.append(file_prj)
-            spfuncs_prj.rastercalc(net.testnet, raster_values_prj, file_prj, self.rasters)
+            with stage('projection'):
+                predict = self.conn.monitor.counted('forward passes', net.predict)
+                spfuncs_prj.rastercalc(predict, raster_values_prj, file_prj,
+                                       self.rasters, batch=True)
             ncounter += 1
 
-        average_prj, std_prj = spfuncs_prj.modelstats(prjFiles, out_dir, sufix="_prj")
+        with stage('stats'):
+            average_prj, std_prj = spfuncs_prj.modelstats(prjFiles, out_dir, sufix="_prj")
 
+        import nnGraphs
         Maps = nnGraphs.throwgraph(nnGraphs.MapsGraph, average_prj, std_prj, 
                                    "Projection_map", out_dir, spfuncs_prj.nodata)
-        self.conn.processGraph(Maps)
+        with stage('graphs'):
+            self.conn.processGraphs([Maps])
 
         self.conn.showResults(["Results_map.png","Projection_map.png"])
         
         self.conn.modify_button('normal', 'all')
 
+    def export_text(self, out_dir, **kwargs):
+        '''Exports the results logs saved with the binary backend in the
+           output folder to text files.'''
+        self.conn.modify_button('disable', 'all')
+        files = exporttext(out_dir)
+        self.conn.display_msg(EXPORT_MSG % (len(files), out_dir))
+        self.conn.modify_button('normal', 'all')
+
     def hint(self, hiddenlyrs = 3, repetitions = 5, percentage = 50,
-                 method = RANDOM_METHOD, iterinter = 25, **kwargs):
+                 method = RANDOM_METHOD, iterinter = 25,
+                 backend = nnBackends.AUTO, optimizer = nnOptimizers.SGD,
+                 hintmode = GRID_HINT, **kwargs):
         '''Gives a Learning Rate hint based on the network scheme, momentum
            and internal iterations. The results is a percentage of the maximum
-           value of error change'''
+           value of error change. With hintmode 'range' a single network is
+           trained with increasing learning rates (see rangetest()).
+           The hint is always for the sgd optimizer (other optimizers are
+           ignored with a message).'''
 
         self.conn.modify_button('disable', 'all')
+        if optimizer <> nnOptimizers.SGD:
+            self.conn.display_msg(HINTSGD_MSG % optimizer)
+            optimizer = nnOptimizers.SGD
 
         LR = [0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 
               0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
@@ -648,12 +1045,39 @@ class Manager():
         NeuralShape.append(1) # One output only
 
         # Create network
+        self.selectbackend(backend, NeuralShape)
         net = NN(NeuralShape, iterations=iterinter)
+        net.optimizer = optimizer
         
         if repetitions > 5: repetitions == 5 # Maximum allowed of repetitions for hint
         allData, allVariables, DataCoords = self.totaldata
         subsets = nnFuncs.subsets(allData, allVariables, DataCoords)
 
+        if hintmode == RANGE_HINT:
+            repmethod = subsets.repeatData(percentage, 1)
+            targets, inputs, ttest, itest = repmethod.next()
+            repmethod.close()
+            rates, losses = self.rangetest(net, inputs, targets)
+            # Loss descent of each step (losses[i] is the loss after the
+            # step with rates[i], so descent[i] is the drop of rates[i+1])
+            descent = [losses[i] - losses[i+1] for i in xrange(len(rates) - 1)]
+            steprates = rates[1:]
+            steepest = max(descent)
+            if steepest > 0:
+                hint = steprates[descent.index(steepest)]
+                bars = [int(max(x, 0) / steepest * 75) for x in descent]
+            else:
+                hint = rates[losses.index(min(losses))]
+                bars = [0] * len(descent)
+            msg = ""
+            for item, bar in zip(steprates, bars):
+                msg += "\n%.5f : %s" % (item, '*' * bar)
+            self.conn.display_msg(RANGEHINT_MSG)
+            self.conn.display_msg(msg)
+            self.conn.display_msg(HINTLR_MSG % hint)
+            self.conn.modify_button('normal', ['READ', 'RUN', 'PROJECT', 'HINT', 'METHOD', 'OPTION'])
+            return
+
         hint_list = []
         total = len(LR)*repetitions
         progress = 1
@@ -700,6 +1124,37 @@ class Manager():
         self.conn.display_msg(msg)
         self.conn.modify_button('normal', ['READ', 'RUN', 'PROJECT', 'HINT', 'METHOD', 'OPTION'])
 
-
-
-
+    def rangetest(self, net, inputs, targets):
+        '''Learning rate range test: trains a single network while the
+           learning rate increases exponentially (from RANGE_LR[0] to
+           RANGE_LR[1]) at each mini-epoch of 1/RANGE_BATCH of the
+           patterns. Mini-epochs take every RANGE_BATCH-th pattern, so
+           each one mixes presences and absences (the training data keeps
+           them in file order). Returns the learning rates and the smoothed losses
+           (sum of squared errors of all patterns) after each step.'''
+        lrmin, lrmax = RANGE_LR
+        factor = (lrmax / lrmin) ** (1.0 / (RANGE_STEPS - 1))
+        net.rndWeights()
+        rates, losses = [], []
+        smooth = best = None
+        for step in xrange(RANGE_STEPS):
+            self.conn.progress_bar(step, RANGE_STEPS)
+            first = step % RANGE_BATCH
+            batch = inputs[first::RANGE_BATCH]
+            net.LearningRate = lrmin * factor**step
+            net.loaddata(batch, targets[first::RANGE_BATCH])
+            net.trainnet(0)
+            self.conn.monitor.count('training patterns',
+                                    len(batch) * net.iterations)
+            loss = net.neterror(inputs, targets)[0]
+            if smooth is None:
+                smooth = loss
+            else:
+                smooth = RANGE_SMOOTH * smooth + (1 - RANGE_SMOOTH) * loss
+            rates.append(net.LearningRate)
+            losses.append(smooth)
+            if best is None or smooth < best:
+                best = smooth
+            elif smooth > RANGE_STOP * best:
+                break
+        return rates, losses
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from contextlib import contextmanager
+from os import path
+import cProfile
+import gc
+import json
+import os
+import sys
+import thread
+import time
+
+try:
+    import resource
+    RESOURCE = True
+except ImportError:
+    RESOURCE = False
+
+try:
+    import tracemalloc
+    TRACEMALLOC = True
+except ImportError:
+    TRACEMALLOC = False
+
+TIMINGS_FILE    = 'timings.json'
+TRACE_FILE      = 'trace.json'
+PROFILE_FILE    = 'profile_%s.prof'
+MEMORY_FILE     = 'memory_%s.txt'
+TOP_ALLOCATIONS = 25
+
+STAGE_MSG   = "Stage %s (%s calls): %.3f s wall, %.3f s CPU, " +\
+              "process peak RSS so far %s MB (%s MB raised by the stage)"
+COUNTER_MSG = "    %s: %s (%.1f per second)"
+MEMORY_MSG  = "Top %s allocations of stage %s"
+OBJECTS_MSG = "%-40s %12s objects %12.1f KiB"
+
+def cputime():
+    '''User and system CPU time of the process (seconds).'''
+    times = os.times()
+    return times[0] + times[1]
+
+def peakrss():
+    '''Peak resident set size of the process in MB (None if unavailable).'''
+    if not RESOURCE:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes in Mac OS X and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return rss / 1048576.0
+    return rss / 1024.0
+
+class monitor():
+    '''Records the cost of the stages of a run. Stages can be nested
+       (sub-stages are named 'stage/sub-stage') and repeated (wall and CPU
+       times are summed over the calls). Counters are added to all the
+       stages running when counted.
+       Memory is the peak resident set size of the process when the stage
+       ends (a high-water mark, so it is not per stage) and how much the
+       stage raised it (the largest rise over its calls).
+       When tracing, stages and spans are also kept as begin/end events in
+       the Chrome trace-event format (see savetrace).'''
+    def __init__(self):
+        self.stack  = []
+        self.order  = []
+        self.stages = {}
+        self.events = None
+
+    def starttrace(self):
+        '''Starts keeping trace events (if not started yet).'''
+        if self.events is None:
+            self.events = []
+
+    def _event(self, phase, name, args):
+        self.events.append({'name': name, 'cat': 'simapse', 'ph': phase,
+                            'ts': time.time() * 1e6, 'pid': os.getpid(),
+                            'tid': thread.get_ident(), 'args': args})
+
+    @contextmanager
+    def span(self, name, **args):
+        '''Context manager adding a span (begin and end events with args)
+           to the trace. It does nothing if not tracing.'''
+        if self.events is None:
+            yield None
+            return
+        self._event('B', name, args)
+        try:
+            yield None
+        finally:
+            self._event('E', name, {})
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.order.append(name)
+            self.stages[name] = {'name': name, 'calls': 0, 'wall': 0.0,
+                                 'cpu': 0.0, 'process_peak_rss_mb': None,
+                                 'peak_rss_growth_mb': None,
+                                 'counters': {}}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, **args):
+        '''Context manager timing a stage (or a sub-stage if another stage
+           is running). It is also a span of the trace with args.'''
+        record = self._record('/'.join(self.stack + [name]))
+        self.stack.append(name)
+        wall, cpu, rss = time.time(), cputime(), peakrss()
+        try:
+            with self.span(name, **args):
+                yield record
+        finally:
+            record['calls'] += 1
+            record['wall'] += time.time() - wall
+            record['cpu'] += cputime() - cpu
+            record['process_peak_rss_mb'] = peakrss()
+            if rss is not None:
+                growth = record['process_peak_rss_mb'] - rss
+                record['peak_rss_growth_mb'] = max(growth,
+                                            record['peak_rss_growth_mb'])
+            self.stack.pop()
+
+    def count(self, counter, n=1):
+        '''Adds n to a counter of all the running stages.'''
+        for i in xrange(len(self.stack)):
+            counters = self.stages['/'.join(self.stack[:i+1])]['counters']
+            counters[counter] = counters.get(counter, 0) + n
+
+    def counted(self, counter, func):
+        '''Returns func counting the patterns of its first argument (a
+           single pattern or a list of patterns) in counter.'''
+        def wrapper(inputs, *args, **kwargs):
+            if len(inputs) and type(inputs[0]) is list:
+                self.count(counter, len(inputs))
+            else:
+                self.count(counter)
+            return func(inputs, *args, **kwargs)
+        return wrapper
+
+    def summary(self, stage=None):
+        '''Returns the records of a stage and its sub-stages (all stages if
+           stage is None) with the rates of the counters.'''
+        records = []
+        for name in self.order:
+            if stage is not None and name <> stage and \
+               not name.startswith(stage + '/'):
+                continue
+            record = dict(self.stages[name])
+            wall = record['wall']
+            record['rates'] = dict([(x, y / wall if wall else 0.0) for x, y
+                                    in record['counters'].items()])
+            records.append(record)
+        return records
+
+    def report(self, write, stage=None):
+        '''Writes the summary of a stage (all stages if None) as text lines
+           with the function write (e.g. a logger method).'''
+        for record in self.summary(stage):
+            rss = [record['process_peak_rss_mb'],
+                   record['peak_rss_growth_mb']]
+            rss = ['%.1f' % x if x is not None else 'n/a' for x in rss]
+            write(STAGE_MSG % (record['name'], record['calls'],
+                               record['wall'], record['cpu'], rss[0], rss[1]))
+            for counter in sorted(record['counters']):
+                write(COUNTER_MSG % (counter, record['counters'][counter],
+                                     record['rates'][counter]))
+
+    def save(self, outdir, filename=TIMINGS_FILE):
+        '''Writes the summary of all stages to a json file in outdir.'''
+        filename = path.join(outdir, filename)
+        with open(filename, 'w') as output:
+            json.dump({'stages': self.summary()}, output, indent=1,
+                      sort_keys=True)
+        return filename
+
+    def savetrace(self, outdir, filename=TRACE_FILE):
+        '''Writes the trace events to a json file in outdir that can be
+           opened in chrome://tracing or Perfetto.'''
+        filename = path.join(outdir, filename)
+        with open(filename, 'w') as output:
+            json.dump({'traceEvents': self.events or [],
+                       'displayTimeUnit': 'ms'}, output)
+        return filename
+
+@contextmanager
+def profile(outdir, stage):
+    '''Context manager saving a cProfile of the block (current thread) as
+       profile_<stage>.prof in outdir (see the pstats module).'''
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path.join(outdir, PROFILE_FILE % stage))
+
+def objectsizes():
+    '''Number and size (bytes) of the live objects tracked by the garbage
+       collector by type.'''
+    sizes = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        count, size = sizes.get(name, (0, 0))
+        sizes[name] = (count + 1, size + sys.getsizeof(obj))
+    return sizes
+
+@contextmanager
+def tracememory(outdir, stage, top=TOP_ALLOCATIONS):
+    '''Context manager writing the top allocations made in the block that
+       are still alive at its end to memory_<stage>.txt in outdir. It uses
+       tracemalloc (by line of code) when available, otherwise the growth
+       of the objects tracked by the garbage collector (by type).'''
+    if TRACEMALLOC:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    else:
+        before = objectsizes()
+    try:
+        yield None
+    finally:
+        if TRACEMALLOC:
+            after = tracemalloc.take_snapshot()
+            if not tracing:
+                tracemalloc.stop()
+            lines = [str(x) for x in
+                     after.compare_to(before, 'lineno')[:top]]
+        else:
+            after = objectsizes()
+            growth = []
+            for name, (count, size) in after.items():
+                count0, size0 = before.get(name, (0, 0))
+                if size > size0:
+                    growth.append((size - size0, count - count0, name))
+            growth.sort(reverse=True)
+            lines = [OBJECTS_MSG % (x[2], x[1], x[0] / 1024.0)
+                     for x in growth[:top]]
+        output = open(path.join(outdir, MEMORY_FILE % stage), 'w')
+        output.write(MEMORY_MSG % (top, stage) + '\n')
+        output.write('\n'.join(lines) + '\n')
+        output.close()
+
+@contextmanager
+def nostage(*args):
+    '''Stands for monitor.stage when there is no monitor.'''
+    yield None
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from itertools import izip
+from math import sqrt
+
+SGD = 'sgd'
+
+# Rprop (iRprop-) parameters
+ETA_PLUS  = 1.2
+ETA_MINUS = 0.5
+DELTA_MAX = 50.0
+DELTA_MIN = 1e-6
+
+# Adam parameters
+BETA1   = 0.9
+BETA2   = 0.999
+EPSILON = 1e-8
+
+# L-BFGS parameters
+MEMORY     = 10     # Number of correction pairs kept
+ARMIJO     = 1e-4   # Sufficient decrease of the line search
+MAX_SEARCH = 20     # Maximum number of step halvings
+CURVATURE  = 1e-10  # Minimum s.y for a correction pair
+
+class optimizer():
+    '''Full-batch optimizers. Each step updates the network weights from the
+       error of all loaded patterns and its gradient (lossgradient() of the
+       backends). The state is kept in net.optstate, which is reset when
+       the weights are randomized. The default 'sgd' is not an optimizer
+       object: it is the online training with learning rate and momentum
+       of the backends epoch().'''
+    name = None
+
+    def step(self, net, lossgradient):
+        '''Updates the weights of the net. lossgradient(net) returns the
+           error and the gradient for the current weights, which are given
+           to update(net, grads, state) of the gradient based optimizers
+           (optimizers with their own search, as lbfgs, replace step).'''
+        self.update(net, lossgradient(net)[1], self.getstate(net))
+
+    def getstate(self, net):
+        '''State of the optimizer in the net (initialized if needed).'''
+        state = net.optstate
+        if state is None or state['name'] <> self.name:
+            state = net.optstate = self.init(net)
+        return state
+
+    def init(self, net):
+        '''Initial state for the weights of the net.'''
+        return {'name': self.name}
+
+def fill(weights, value):
+    '''Nested lists shaped as the weights filled with a value.'''
+    return [[[value] * len(row) for row in layer] for layer in weights]
+
+class rprop(optimizer):
+    '''Resilient backpropagation (iRprop-). Each weight has its own update
+       value, increased while the sign of its gradient is kept and
+       decreased when it changes. Only the sign of the gradient is used, so
+       it is largely insensitive to the learning rate, which is the initial
+       update value.'''
+    name = 'rprop'
+
+    def init(self, net):
+        return {'name': self.name,
+                'delta': fill(net.weights, net.LearningRate),
+                'previous': fill(net.weights, 0.0)}
+
+    def update(self, net, grads, state):
+        for W, G, D, P in izip(net.weights, grads, state['delta'],
+                               state['previous']):
+            for w, g, d, p in izip(W, G, D, P):
+                for i in xrange(len(w)):
+                    sign = g[i] * p[i]
+                    if sign > 0:
+                        d[i] = min(d[i] * ETA_PLUS, DELTA_MAX)
+                    elif sign < 0:
+                        d[i] = max(d[i] * ETA_MINUS, DELTA_MIN)
+                        g[i] = 0.0
+                    if g[i] > 0:
+                        w[i] -= d[i]
+                    elif g[i] < 0:
+                        w[i] += d[i]
+                    p[i] = g[i]
+
+class adam(optimizer):
+    '''Adam: steps of the learning rate size scaled by running averages of
+       the gradient and of its square (with bias correction).'''
+    name = 'adam'
+
+    def init(self, net):
+        return {'name': self.name, 't': 0,
+                'm': fill(net.weights, 0.0),
+                'v': fill(net.weights, 0.0)}
+
+    def update(self, net, grads, state):
+        state['t'] += 1
+        LR = net.LearningRate
+        c1, c2 = 1 - BETA1**state['t'], 1 - BETA2**state['t']
+        for W, G, M, V in izip(net.weights, grads, state['m'], state['v']):
+            for w, g, m, v in izip(W, G, M, V):
+                for i in xrange(len(w)):
+                    m[i] = BETA1 * m[i] + (1 - BETA1) * g[i]
+                    v[i] = BETA2 * v[i] + (1 - BETA2) * g[i] * g[i]
+                    w[i] -= LR * (m[i] / c1) / (sqrt(v[i] / c2) + EPSILON)
+
+def flatten(weights):
+    '''Flat list of nested weights (layers of neuron rows).'''
+    return [w for layer in weights for row in layer for w in row]
+
+def unflatten(flat, weights):
+    '''Copies a flat list back into the nested weights.'''
+    start = 0
+    for layer in weights:
+        for row in layer:
+            row[:] = flat[start:start + len(row)]
+            start += len(row)
+
+def dot(x, y):
+    return sum([a * b for a, b in izip(x, y)])
+
+class lbfgs(optimizer):
+    '''Limited memory BFGS over the flattened weight vector: a quasi-Newton
+       direction from the last MEMORY weight and gradient changes (two-loop
+       recursion) and a backtracking line search with sufficient decrease.
+       Each step is one quasi-Newton iteration; small networks usually
+       converge in tens of iterations. The learning rate and momentum are
+       not used.'''
+    name = 'lbfgs'
+
+    def init(self, net):
+        return {'name': self.name, 's': [], 'y': [], 'weights': None,
+                'data': None, 'error': None, 'gradient': None}
+
+    def step(self, net, lossgradient):
+        state = self.getstate(net)
+        w = flatten(net.weights)
+        # Error and gradient of the last step are reused if the weights and
+        # the data did not change (e.g. between reports)
+        if state['weights'] == w and state['data'] == id(net.trainInputs):
+            error, g = state['error'], state['gradient']
+        else:
+            error, grads = lossgradient(net)
+            g = flatten(grads)
+        s, y = state['s'], state['y']
+
+        #Two-loop recursion for the direction -H.g
+        q = g[:]
+        alphas = []
+        for si, yi in reversed(zip(s, y)):
+            alpha = dot(si, q) / dot(yi, si)
+            q = [a - alpha * b for a, b in izip(q, yi)]
+            alphas.append(alpha)
+        if s:
+            gamma = dot(s[-1], y[-1]) / dot(y[-1], y[-1])
+            q = [gamma * a for a in q]
+        for (si, yi), alpha in izip(zip(s, y), reversed(alphas)):
+            beta = dot(yi, q) / dot(yi, si)
+            q = [a + (alpha - beta) * b for a, b in izip(q, si)]
+        direction = [-a for a in q]
+        slope = dot(g, direction)
+        if not slope < 0:
+            #Not a descent direction: restart from the gradient
+            del s[:], y[:]
+            direction = [-a for a in g]
+            slope = -dot(g, g)
+        if slope == 0:
+            return
+
+        #Backtracking line search (the first step is scaled to the
+        #gradient size until there is curvature information)
+        t = 1.0 if s else min(1.0, 1.0 / sum([abs(a) for a in g]))
+        for i in xrange(MAX_SEARCH):
+            new = [a + t * b for a, b in izip(w, direction)]
+            unflatten(new, net.weights)
+            newerror, grads = lossgradient(net)
+            if newerror <= error + ARMIJO * t * slope:
+                break
+            t *= 0.5
+        else:
+            #No decrease: keeps the weights and forgets the memory
+            unflatten(w, net.weights)
+            del s[:], y[:]
+            return
+
+        newg = flatten(grads)
+        si = [a - b for a, b in izip(new, w)]
+        yi = [a - b for a, b in izip(newg, g)]
+        if dot(si, yi) > CURVATURE:
+            s.append(si)
+            y.append(yi)
+            if len(s) > MEMORY:
+                del s[0], y[0]
+        state.update(weights=new, data=id(net.trainInputs), error=newerror,
+                     gradient=newg)
+
+OPTIMIZERS = {}
+for cls in (rprop, adam, lbfgs):
+    OPTIMIZERS[cls.name] = cls()
+
+def names():
+    '''Names of the available optimizers (default first).'''
+    return [SGD] + sorted(OPTIMIZERS)
+
+def get(name):
+    '''Returns the optimizer object of a name.'''
+    if name not in OPTIMIZERS:
+        raise ValueError('Unknown optimizer: %s' % name)
+    return OPTIMIZERS[name]
@@ -24,67 +24,521 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
 
+from array import array
 from datetime import date
+from os import path, linesep, remove, rename
+from zipfile import ZipFile
 import logging
 import logging.handlers as handlers
+import imp
+import struct
+import sys
 
-from nnFuncs import calc2dlists
+# numpy is only imported when statistics are memorized (it is slow to
+# import)
+try:
+    imp.find_module('numpy')
+    NUMPY = True
+except ImportError:
+    NUMPY = False
+
+# Number of characters buffered per level before writing to file
+BUFFER_SIZE = 1048576
+
+# Recorder backends
+TEXT_BACKEND   = 'text'
+BINARY_BACKEND = 'binary'
+BACKENDS       = [TEXT_BACKEND, BINARY_BACKEND]
+
+# Container of the binary backend (one per output folder), name of the
+# dataset that keeps the header of each level and prefix of datasets
+# written without a name
+CONTAINER = 'results_logs.zip'
+HEADER    = '.header'
+UNNAMED   = '.unnamed'
+
+# Names written by finalize()
+MEMFUNCS  = ['Average', 'StDev']
+
+# Container of the running statistics of the output folder (to append
+# repetitions to a finished run) and dataset of the names memorized
+STATE     = 'results_state.zip'
+NAMES     = '.names'
+
+def textlines(values, name = False, sep = ';', prename = 'Model_'):
+    '''Returns the lines of text of a list of values (or a list of lists)
+       as they are written in the results files.'''
+    if type(values[0]) == list:
+        lines = []
+        if name:
+            lines.append(prename + name)
+        lines.extend([sep.join([str(x) for x in value]) for value in values])
+    else:
+        txt = sep.join([str(x) for x in values])
+        if name:
+            txt = prename + str(name) + sep + txt
+        lines = [txt]
+    return lines
+
+def packvalues(values):
+    '''Packs a list of values (or a list of lists) to a binary string: number
+       of rows (0 for a single list) and columns, the type of each column
+       of a single list ('i' for integers, 'd' for floats) and the values
+       as little-endian doubles.'''
+    if type(values[0]) == list:
+        rows, cols, kinds = len(values), len(values[0]), ''
+        data = array('d', [x for row in values for x in row])
+    else:
+        rows, cols = 0, len(values)
+        kinds = ''.join([type(x) in (int, long) and 'i' or 'd' for x in values])
+        data = array('d', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return struct.pack('<ii', rows, cols) + kinds + data.tostring()
+
+def unpackvalues(data, typed = False):
+    '''Unpacks a binary string created by packvalues(). If typed is True,
+       integer columns are returned as integers.'''
+    rows, cols = struct.unpack('<ii', data[:8])
+    start = 8
+    if rows == 0:
+        kinds = data[8:8+cols]
+        start += cols
+    values = array('d')
+    values.fromstring(data[start:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    values = values.tolist()
+    if rows > 0:
+        return [values[x:x+cols] for x in xrange(0, rows * cols, cols)]
+    if typed:
+        values = [int(v) if k == 'i' else v for k, v in zip(kinds, values)]
+    return values
+
+def exporttext(outdir, sep = ';', prename = 'Model_', container = CONTAINER):
+    '''Exports all the levels stored in the binary container of the output
+       folder to text files with the same format of the text backend.'''
+    if outdir[-1] not in ['/', '\\']: outdir = outdir + '/'
+    zipfile = ZipFile(outdir + container, 'r')
+    files, order = {}, []
+    for entry in zipfile.namelist():
+        fileend, level, name = entry.split('/', 2)
+        if level == '':
+            filename = outdir + fileend + '.txt'
+        else:
+            filename = outdir + level + '_' + fileend + '.txt'
+        if filename not in files:
+            files[filename] = []
+            order.append(filename)
+        data = zipfile.read(entry)
+        if name == HEADER:
+            files[filename].append(data)
+        else:
+            if name.startswith(UNNAMED):
+                name = False
+            values = unpackvalues(data, True)
+            files[filename].extend(textlines(values, name, sep, prename))
+    zipfile.close()
+    for filename in order:
+        recfile = open(filename, 'w')
+        recfile.write('\n'.join(files[filename]) + '\n')
+        recfile.close()
+    return order
+
+def rewrite(container, prefix, entries = ()):
+    '''Rewrites a zip container without the datasets starting with prefix
+       and adds the (entry, data) items given.'''
+    temp = container + '.tmp'
+    new = ZipFile(temp, 'w', allowZip64=True)
+    if path.isfile(container):
+        old = ZipFile(container, 'r')
+        for entry in old.namelist():
+            if not entry.startswith(prefix):
+                new.writestr(entry, old.read(entry))
+        old.close()
+    for entry, data in entries:
+        new.writestr(entry, data)
+    new.close()
+    if path.isfile(container):
+        remove(container)
+    rename(temp, container)
+
+def savestate(container, prefix, stats, names = None):
+    '''Saves running statistics in the container, replacing the previous
+       ones of prefix. stats is a dictionary of level -> (count, shape,
+       mean, M2), with mean and M2 as flat lists; names is an optional
+       list of the names memorized.'''
+    entries = []
+    for level in stats:
+        count, shp, mean, m2 = stats[level]
+        if level == None:
+            level = ''
+        entry = '%s/%s/' % (prefix, level)
+        entries.append((entry + 'info', packvalues([count] + list(shp))))
+        entries.append((entry + 'mean', packvalues(list(mean))))
+        entries.append((entry + 'm2', packvalues(list(m2))))
+    if names <> None:
+        entries.append(('%s/%s' % (prefix, NAMES), '\n'.join(names)))
+    rewrite(container, prefix + '/', entries)
+
+def loadstate(container, prefix):
+    '''Returns the running statistics (as given to savestate()) and the
+       names saved for prefix in the container. Both are empty if there
+       is no container or no statistics for prefix.'''
+    stats, names = {}, []
+    if not path.isfile(container):
+        return stats, names
+    zipfile = ZipFile(container, 'r')
+    entries = zipfile.namelist()
+    for entry in entries:
+        parts = entry.split('/')
+        if parts[0] <> prefix:
+            continue
+        if parts[1] == NAMES:
+            names = [x for x in zipfile.read(entry).split('\n') if x]
+        elif parts[-1] == 'info':
+            level = '/'.join(parts[1:-1])
+            info = unpackvalues(zipfile.read(entry), True)
+            base = entry[:-len('info')]
+            mean = unpackvalues(zipfile.read(base + 'mean'))
+            m2 = unpackvalues(zipfile.read(base + 'm2'))
+            stats[level or None] = (info[0], tuple(info[1:]), mean, m2)
+    zipfile.close()
+    return stats, names
+
+class binstore():
+    '''Stores the levels of a recorder as typed binary arrays in a zip
+       container shared by all recorders of the output folder. Each name
+       (model) is a separate dataset named <fileend>/<level>/<name>, so
+       numeric data is never converted to text.'''
+    def __init__(self, outdir, fileend, append = False,
+                 buffersize = BUFFER_SIZE, container = CONTAINER):
+        '''Opens the container to start writing datasets
+              outdir     -> Output directory (with final separator)
+              fileend    -> Name of the recorder inside the container
+              append     -> If False, old datasets of fileend are removed
+              buffersize -> Number of bytes kept in memory before writing'''
+        self.container  = outdir + container
+        self.fileend    = fileend
+        self.buffersize = buffersize
+        self.pending    = [] #Datasets waiting to be written
+        self.pendingsize = 0
+        self.unnamed    = 0  #Counter of datasets stored without name
+        if not append and path.isfile(self.container):
+            self._remove()
+
+    def _remove(self, names = None):
+        '''Rewrites the container without the datasets of fileend (only
+           those of the given names, if any).'''
+        prefix = self.fileend + '/'
+        temp = self.container + '.tmp'
+        old = ZipFile(self.container, 'r')
+        new = ZipFile(temp, 'w', allowZip64=True)
+        for entry in old.namelist():
+            if entry.startswith(prefix):
+                if names == None or entry.split('/')[-1] in names:
+                    continue
+            new.writestr(entry, old.read(entry))
+        old.close()
+        new.close()
+        remove(self.container)
+        rename(temp, self.container)
+
+    def _entry(self, level, name):
+        '''Returns the name of the dataset inside the container.'''
+        if level == None:
+            level = ''
+        return '%s/%s/%s' % (self.fileend, level, name)
+
+    def _put(self, entry, data):
+        '''Adds a dataset to the buffer and writes it when full.'''
+        self.pending.append((entry, data))
+        self.pendingsize += len(data)
+        if self.pendingsize >= self.buffersize:
+            self.flush()
+
+    def header(self, txt, level = None):
+        '''Stores the text of the level header.'''
+        self._put(self._entry(level, HEADER), txt)
+
+    def put(self, values, level = None, name = None):
+        '''Stores a list of values (or a list of lists) as a dataset.
+           Values without name are stored with an UNNAMED prefix.'''
+        if name == None:
+            name = UNNAMED + str(self.unnamed)
+            self.unnamed += 1
+        self._put(self._entry(level, name), packvalues(values))
+
+    def flush(self):
+        '''Writes all pending datasets to the container.'''
+        if self.pending:
+            zipfile = ZipFile(self.container, 'a', allowZip64=True)
+            for entry, data in self.pending:
+                zipfile.writestr(entry, data)
+            zipfile.close()
+            self.pending = []
+            self.pendingsize = 0
+
+    def recall(self, level, name = None):
+        '''Returns the header text and the values of name (None if not
+           found) for the level.'''
+        self.flush()
+        header, values = None, None
+        zipfile = ZipFile(self.container, 'r')
+        entries = zipfile.namelist()
+        entry = self._entry(level, HEADER)
+        if entry in entries:
+            header = zipfile.read(entry)
+        entry = self._entry(level, name)
+        if name <> None and entry in entries:
+            values = unpackvalues(zipfile.read(entry))
+        zipfile.close()
+        return header, values
+
+    def names(self, level):
+        '''Returns all names stored for the level.'''
+        self.flush()
+        prefix = self._entry(level, '')
+        zipfile = ZipFile(self.container, 'r')
+        names = [x[len(prefix):] for x in zipfile.namelist() 
+                 if x.startswith(prefix)]
+        zipfile.close()
+        return [x for x in names if x <> HEADER and not x.startswith(UNNAMED)]
+
+def logcontents(outdir, fileend, level = None, backend = TEXT_BACKEND,
+                sep = ';', prename = 'Model_'):
+    '''Returns the header text and the names (without the Average and
+       StDev of finalize) of a level of a results log in outdir, without
+       changing it. The header is None and the names are empty if there is
+       no such log.'''
+    if outdir[-1] not in ['/', '\\']: outdir = outdir + '/'
+    header, names = None, []
+    if backend == BINARY_BACKEND:
+        if path.isfile(outdir + CONTAINER):
+            store = binstore(outdir, fileend, True)
+            header = store.recall(level)[0]
+            names = store.names(level)
+    else:
+        if level == None:
+            filename = outdir + fileend + '.txt'
+        else:
+            filename = outdir + '%s_%s.txt' % (level, fileend)
+        if path.isfile(filename):
+            logfile = open(filename, 'r')
+            header = logfile.readline().rstrip('\r\n') or None
+            for line in logfile:
+                if line.startswith(prename):
+                    names.append(line.split(sep)[0].strip()[len(prename):])
+            logfile.close()
+    return header, [x for x in names if x not in MEMFUNCS]
+
+def shape(values):
+    '''Returns the shape of a list of values (or a list of lists).'''
+    if type(values[0]) == list:
+        return (len(values), len(values[0]))
+    return (len(values),)
+
+def flatvalues(values):
+    '''Returns a list of values (or a list of lists) as a flat array.'''
+    if type(values[0]) == list:
+        return array('d', [x for row in values for x in row])
+    return array('d', values)
+
+def unflatvalues(values, shape):
+    '''Returns a flat list as a list (or a list of lists) with shape.'''
+    if len(shape) == 1:
+        return values
+    cols = shape[1]
+    return [values[x:x+cols] for x in xrange(0, len(values), cols)]
 
 class recorder():
     '''Just a simple I/O manager to save and recall results files.
        Note:
           Levels represent diferent files (different variables).
-          Names represent diferent data in the same file (different models).'''
+          Names represent diferent data in the same file (different models).
+          Lines are buffered in memory per level and only written to disk
+          when the buffer is full, when the level is finalized or when
+          flush() is called. The byte offset of each name written is kept
+          in an index so it can be recalled without scanning the file.
+          With the binary backend, levels are kept as typed arrays in the
+          container of the output folder instead (see binstore).
+          The running statistics can be saved (savestate) so a recorder
+          opened in append mode continues them with new names.'''
     headeronly = False
     def __init__(self, outdir, fileend, levels = None, sep=';', 
-                 append=False, prename='Model_'):
+                 append=False, prename='Model_', buffersize=BUFFER_SIZE,
+                 backend=TEXT_BACKEND):
         '''Opens the recfile to start writing results
               outdir -> Output directory
               fileend-> A string to place at the end of filename
               levels -> Levels of data (if None, filename = prefix.txt)
               sep    -> separator of values
-              append -> If True, opens the file in append mode.'''
+              append -> If True, opens the file in append mode: the
+                        Average and StDev written by finalize() are
+                        removed and the saved running statistics and
+                        names are restored (or memorized again from the
+                        file when they were not saved).
+              buffersize -> Number of characters kept in memory per level
+                            before writing to file.
+              backend -> 'text' for text files or 'binary' for the binary
+                         container.'''
         self.sep       = sep
         self.levels    = levels
         self.names     = [] #Keeps record of available data
         self.mem       = [] #Keeps track of memorized data
         self.prename   = str(prename)
-        self.memfuncs  = ['Average', 'StDev']
+        self.memfuncs  = MEMFUNCS[:]
+        self.counts    = {} #Number of memorized values per level
+        self.shapes    = {} #Shape of memorized values without numpy
+        self.buffers   = {} #Lines waiting to be written per level
+        self.buffered  = {} #Number of characters in buffer per level
+        self.buffersize = buffersize
+        self.offsets   = {} #Byte offset and size of each name per level
+        self.headers   = {} #Memorized headers per level
+        self.headertxt = {} #Text of the headers added per level
+        self.position  = {} #Byte position at the end of each level file
+        self.store     = None
         if outdir[-1] not in ['/', '\\']: outdir = outdir + '/'
+        self.outdir    = outdir
+        self.fileend   = fileend
         mode = 'w'
         if append: mode = 'a'
         #Just creates the empty file or deletes the old one
-        if levels <> None:
+        if backend == BINARY_BACKEND:
+            self.store = binstore(outdir, fileend, append, buffersize)
+            self.file = None
+            if append and path.isfile(self.store.container):
+                self.store._remove(self.memfuncs)
+        elif levels <> None:
             recfile = outdir + '%s' + '_' + fileend + '.txt'
             for level in levels:
                 newfile = open(recfile % level, mode)
                 newfile.close()
+                if append: self._trim(recfile % level)
+                self.position[level] = path.getsize(recfile % level)
             self.file = recfile
         else:
             recfile = outdir + fileend + '.txt'
             newfile = open(recfile, mode)
             newfile.close()
+            if append: self._trim(recfile)
+            self.position[None] = path.getsize(recfile)
             self.file = recfile
+        if append:
+            self.loadstate()
+            self._rebuild()
+
+    def _rebuild(self):
+        '''Memorizes again the names already in the levels whose running
+           statistics were not saved or do not count all the names (e.g.
+           the state container is missing or older than the logs).'''
+        for level in self.levels or [None]:
+            records = self._records(level)
+            if level in self.mem:
+                if self.counts[level] == len(records):
+                    continue
+                self.mem.remove(level)
+            for name, values in records:
+                if values:
+                    self.memorize(values, level)
+                if name not in self.names:
+                    self.names.append(name)
+
+    def _records(self, level):
+        '''Returns the names and values of all data in the level (without
+           the Average and StDev of finalize).'''
+        if self.store:
+            names = self.store.names(level)
+            records = [(x, self.store.recall(level, x)[1]) for x in names]
+        else:
+            records = []
+            size = len(self.prename)
+            datafile = open(self._filename(level), 'r')
+            datafile.readline() #header
+            for line in datafile:
+                data = line.strip().split(self.sep)
+                if data[0][:size] == self.prename:
+                    records.append((data[0][size:],
+                                    [float(x) for x in data[1:]]))
+                elif records and data <> ['']:
+                    records[-1][1].append([float(x) for x in data])
+            datafile.close()
+        return [x for x in records if x[0] not in self.memfuncs]
+
+    def _trim(self, filename):
+        '''Truncates a file before the Average and StDev written by
+           finalize().'''
+        prefix = self.prename + self.memfuncs[0]
+        recfile = open(filename, 'rb+')
+        while 1:
+            start = recfile.tell()
+            line = recfile.readline()
+            if not line: break
+            if line.split(self.sep)[0].strip() == prefix:
+                recfile.truncate(start)
+                break
+        recfile.close()
+
+    def _filename(self, level):
+        '''Returns the file name of the level.'''
+        if level <> None:
+            return self.file % level
+        return self.file
+
+    def _put(self, lines, level = None, name = None):
+        '''Adds lines of text to the level buffer and writes the buffer to
+           file when it exceeds the buffer size. If a name is given, the
+           position of the lines in the file is added to the index.'''
+        if level not in self.buffers:
+            self.buffers[level] = []
+            self.buffered[level] = 0
+        size = sum([len(x) for x in lines])
+        nbytes = size + len(linesep) * len(lines)
+        if name <> None:
+            offsets = self.offsets.setdefault(level, {})
+            if name not in offsets:
+                offsets[name] = (self.position[level], nbytes)
+        self.position[level] += nbytes
+        self.buffers[level].extend(lines)
+        self.buffered[level] += size
+        if self.buffered[level] >= self.buffersize:
+            self.flush(level)
+
+    def flush(self, *levels):
+        '''Writes the buffered lines of the levels to the files. If no level
+           is given, all buffers are written.'''
+        if self.store:
+            self.store.flush()
+            return
+        if len(levels) == 0:
+            levels = self.buffers.keys()
+        for level in levels:
+            lines = self.buffers.get(level)
+            if lines:
+                recfile = open(self._filename(level), 'a')
+                recfile.write('\n'.join(lines) + '\n')
+                recfile.close()
+                self.buffers[level] = []
+                self.buffered[level] = 0
 
     def addheader(self, values, level = None, headertxt = 'Variable values'):
         '''Adds one line header to the file.'''
         txt = self.sep.join([str(x) for x in values])
         txt = headertxt + self.sep + txt
-        if level <> None:
-            filename = self.file % level
+        if self.store:
+            self.store.header(txt, level)
         else:
-            filename = self.file
-        recfile = open(filename, 'a')
-        recfile.write(txt + '\n')
-        recfile.close()
+            self._put([txt], level)
+        self.headertxt[level] = txt
 
     def getheader(self, level):
         '''Returns level header.'''
-        #TODO: Memorize headers?
-        self.headeronly = True
-        header, other = self.recall(level, None)
-        self.headeronly = False
-        return header        
+        if level not in self.headers:
+            self.headeronly = True
+            header, other = self.recall(level, None)
+            self.headeronly = False
+            self.headers[level] = header
+        return self.headers[level]
        
     def write(self, values, level = None, name = False, mem=True):
         '''Writes the list of values in the file. When values are a list of 
@@ -93,28 +547,16 @@ class recorder():
                       assumes no levels)
             name   -> is any string to be written in the first column
             mem    -> Memorizes the sum and the sum of squares of the values'''
-        if type(values[0]) == list:
-            if mem == True: self.memorize(values, level)
-            if name:
-                self.write([self.prename + name], level, False, mem=False)
-                if name not in self.names  + self.memfuncs:
-                    self.names.append(name)
-            for value in values:
-                self.write(value, level, False, mem=False)
+        if name and name not in self.names + self.memfuncs:
+            self.names.append(name)
+        if self.store:
+            self.store.put(values, level, name and str(name) or None)
         else:
-            txt = self.sep.join([str(x) for x in values])
-            if name:
-                if name not in self.names + self.memfuncs:
-                    self.names.append(name)
-                txt = self.prename + str(name) + self.sep + txt
-            if level <> None:
-                filename = self.file % level
-            else:
-                filename = self.file
-            recfile = open(filename, 'a')
-            recfile.write(txt + '\n')
-            recfile.close()
-            if mem: self.memorize(values, level)
+            lines = textlines(values, name, self.sep, self.prename)
+            if name: name = str(name)
+            else: name = None
+            self._put(lines, level, name)
+        if mem: self.memorize(values, level)
 
     def write_levels(self, diclevel, name = False, mem = True):
         '''Writes all values from a dictionary to file. Dictionary keys must
@@ -123,7 +565,35 @@ class recorder():
             self.write(diclevel[level], level, name, mem=mem)
 
     def recall(self, level , name):
-        '''Reads results files and returns a list'''
+        '''Reads results files and returns a list. Names written by this
+           recorder are read directly from their position in the file, 
+           otherwise the file is scanned from the top.'''
+        self.flush(level)
+        if self.store:
+            header, datalist = self.store.recall(level, name)
+            if header <> None:
+                header = [float(x) for x in header.split(self.sep)[1:]]
+            return header, datalist
+        if level not in self.headers and level in self.headertxt:
+            txt = self.headertxt[level].split(self.sep)
+            self.headers[level] = [float(x) for x in txt[1:]]
+        header = self.headers.get(level)
+        offset = self.offsets.get(level, {}).get(name)
+        if header <> None and (self.headeronly or offset <> None):
+            if self.headeronly:
+                return header, None
+            datafile = open(self._filename(level), 'rb')
+            datafile.seek(offset[0])
+            data = datafile.read(offset[1]).splitlines()
+            datafile.close()
+            first = data[0].strip().split(self.sep)
+            if len(first) > 1:
+                datalist = [float(x) for x in first[1:]]
+            else:
+                datalist = [[float(x) for x in line.strip().split(self.sep)]
+                            for line in data[1:]]
+            return header, datalist
+
         if level == None:
             datafile = open(self.file, 'r')
         else:
@@ -160,52 +630,104 @@ class recorder():
 
     def memorize(self, values, level=None):
         '''Memorizes a list of level's values that can be retrieved.
-           If level already exists, it is summed to existing values.'''
+           The running mean and sum of squared deviations (M2) of each
+           value are kept as arrays and updated with Welford's algorithm.'''
         v = self.__dict__
+        if NUMPY:
+            import numpy as np
+            x = np.array(values, dtype=float)
+        else:
+            x = flatvalues(values)
         if level in self.mem:
-            mem_s, mem_ss = v[level][0], v[level][1]
-            if type(values[0]) == list:
-                #from nnFuncs import calc2dlists
-                s = calc2dlists(mem_s, values, sum)
-                temp = [[y**2 for y in x] for x in values]
-                ss = calc2dlists(mem_ss, temp, sum)
+            self.counts[level] += 1
+            n = self.counts[level]
+            mean, m2 = v[level][0], v[level][1]
+            if NUMPY:
+                delta = x - mean
+                mean += delta / n
+                m2 += delta * (x - mean)
             else:
-                s = [x + y for x,y in zip(mem_s, values)]
-                ss = [x + y**2 for x,y in zip(mem_ss, values)]
-            v[level][0], v[level][1] = s, ss
+                for i in xrange(len(x)):
+                    delta = x[i] - mean[i]
+                    mean[i] += delta / n
+                    m2[i] += delta * (x[i] - mean[i])
         else:
-            v[level] = []
-            v[level].append(values)
-            if type(values[0]) == list: 
-                v[level].append([[y**2 for y in x] for x in values])
+            if NUMPY:
+                v[level] = [x, np.zeros(x.shape)]
             else:
-                v[level].append([x**2 for x in values])
+                v[level] = [x, array('d', [0.0]) * len(x)]
+                self.shapes[level] = shape(values)
+            self.counts[level] = 1
             self.mem.append(level)
 
+    def savestate(self, container = STATE):
+        '''Saves the running statistics of all memorized levels (and the
+           names written) in the state container of the output folder.
+           Must be called before finalize().'''
+        v = self.__dict__
+        stats = {}
+        for level in self.mem:
+            mean, m2 = v[level]
+            if NUMPY:
+                shp = mean.shape
+                mean, m2 = mean.ravel().tolist(), m2.ravel().tolist()
+            else:
+                shp = self.shapes[level]
+            stats[level] = (self.counts[level], shp, mean, m2)
+        savestate(self.outdir + container, self.fileend, stats,
+                  [str(x) for x in self.names])
+
+    def loadstate(self, container = STATE):
+        '''Restores the running statistics and names saved by
+           savestate().'''
+        v = self.__dict__
+        stats, names = loadstate(self.outdir + container, self.fileend)
+        for level in stats:
+            count, shp, mean, m2 = stats[level]
+            if NUMPY:
+                import numpy as np
+                v[level] = [np.array(mean).reshape(shp),
+                            np.array(m2).reshape(shp)]
+            else:
+                v[level] = [array('d', mean), array('d', m2)]
+                self.shapes[level] = shp
+            self.counts[level] = count
+            if level not in self.mem:
+                self.mem.append(level)
+        for name in names:
+            if name not in self.names:
+                self.names.append(name)
+
     def finalize(self, level=None):
         '''Calculates the average and standard deviation of the level.'''
         v = self.__dict__
-        N = len(self.names)
-        stdfunc = lambda x: ((x[1] - (x[0]**2 / N )) / (N - 1))**0.5
-        if N == 1: stdfunc = lambda x: 0 # to avoid division by 0
         if level in self.mem:
-            mem_s, mem_ss = v[level][0], v[level][1]
-            if type(mem_s[0]) == list:
-                #from nnFuncs import calc2dlists
-                avg = [[y/N for y in x] for x in mem_s]
-                std = calc2dlists(mem_s, mem_ss, stdfunc)
+            N = self.counts[level]
+            mean, m2 = v[level][0], v[level][1]
+            if NUMPY:
+                import numpy as np
+                std = np.zeros(m2.shape)
+                if N > 1: std = np.sqrt(m2 / (N - 1))
+                avg, std = mean.tolist(), std.tolist()
             else:
-                avg = [x/N for x in mem_s]
-                std = [stdfunc([x,y]) for x,y in zip(mem_s, mem_ss)]
+                std = [0.0] * len(m2) # to avoid division by 0
+                if N > 1: std = [(x / (N - 1))**0.5 for x in m2]
+                avg = unflatvalues(mean.tolist(), self.shapes[level])
+                std = unflatvalues(std, self.shapes[level])
             v[level][0], v[level][1] = avg, std
             self.write(avg, level = level, name = 'Average', mem=False)
             self.write(std, level = level, name = 'StDev', mem=False)
+        self.flush(level)
 
     def getnames(self, level):
         '''Reads all names in the file if the list is empty.
            Note:
             Always ignores the first line (header)'''
-        if self.names == []:
+        if self.names == [] and self.store:
+            names = self.store.names(level)
+            self.names = [x for x in names if x not in self.memfuncs]
+        elif self.names == []:
+            self.flush(level)
             sep = self.sep
             size = len(self.prename)
             if level == None:
@@ -227,7 +749,7 @@ class recorder():
     def getmem(self, level):
         '''Returns the list in memory for the level.
            If finalized retunrs [avg, std], otherwise
-           it returns [sum, sum**2].'''
+           it returns the arrays [mean, M2].'''
         return self.__dict__[level]
 
     def getavg(self):
@@ -441,11 +963,16 @@ class htmlreport(html):
         text2 = ['Neural Network Scheme: %s' % nnoptions['scheme'],
                  'Learning Rate: %s' % nnoptions['lrate'],
                  'Momentum: %s' % nnoptions['momentum'],
+                 'Optimizer: %s' % nnoptions['optimizer'],
                  'Iterations: %s (%s auc reports x %s internal iterations)' % (totaliter, nnoptions['iterreport'], nnoptions['iterinter'])]
+        if nnoptions['warmstart']:
+            text2.append('Warm start: %s (%s reports of fine-tuning)' % (nnoptions['warmstart'], nnoptions['finetune'] or nnoptions['iterreport']))
         text3 = ['Subsampling Method: %s with %s' % (nnoptions['method'], details),
                  'Test Percentage: %s' % nnoptions['percentage'],
                  'Pseudoabsences / presence ratio: %s' % nnoptions['apratio'],
                  'AUC Thresholds: %s for train and %s for test' % (nnoptions['auctrain'], nnoptions['auctest'])]
+        if nnoptions['adaptive']:
+            text3.append('Adaptive ensemble size: stopped after %s changes of the averages below %s' % (nnoptions['patience'], nnoptions['tolerance']))
 
         self.chapter('Summary')
         self.paragraph()
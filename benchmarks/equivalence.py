@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from copy import deepcopy
+from os import path
+import argparse
+import random
+import sys
+import time
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Neuron import nnBackends, nnEngine, nnFuncs
+
+KERNELS = ['feedforward', 'backpropag', 'pderiv', 'roc', 'rastercalc']
+
+# Random schemes of the seeded cases (XOR is added to them)
+SCHEMES   = [[3, 3, 1], [5, 6, 4, 1], [8, 10, 1]]
+NPATTERNS = 200
+NCOLS     = 60
+NROWS     = 40
+NODATA    = -9999
+TOLERANCE = 1e-9
+
+ROW_MSG   = "%-12s %-10s %-16s %10.2e %-4s %9.4f s %9.4f s %7.2fx"
+HEAD_MSG  = "%-12s %-10s %-16s %10s %-4s %11s %11s %8s"
+NONE_MSG  = "%-12s no accelerated implementation"
+
+# The compiled training kernel of the jit backend run as plain Python, so
+# it is checked on machines without numba too
+PLAIN = 'jit-python'
+
+class case():
+    '''A seeded network (weights, train data) with a raster stack and
+       real/predicted values for the ROC.'''
+    def __init__(self, name, scheme, inputs, targets, seed):
+        rnd = random.Random(seed)
+        self.name = name
+        self.scheme = scheme
+        self.inputs = inputs
+        self.targets = targets
+        random.seed(seed)
+        net = nnEngine.NN(scheme, iterations=1, LR=0.1, momentum=0.1,
+                          verbosity=0)
+        net.rndWeights()
+        self.weights = deepcopy(net.weights)
+
+        self.spfuncs = nnFuncs.spatial_functions(NCOLS, NROWS, 0.0, 0.0,
+                                                 1.0, NODATA)
+        self.rasters = ['var%s' % x for x in xrange(scheme[0])]
+        self.values = {}
+        for raster in self.rasters:
+            self.values[raster] = [[NODATA if x < 2 and y < 2 else
+                                    rnd.gauss(0, 1) for x in xrange(NCOLS)]
+                                   for y in xrange(NROWS)]
+        self.spfuncs.create_nodata_list(self.values[self.rasters[0]])
+
+        self.real = [float(rnd.random() < 0.5) for x in xrange(NPATTERNS)]
+        self.pred = [round(rnd.random(), 2) for x in self.real]
+
+    def net(self):
+        '''Returns a new network with the weights and data of the case.'''
+        net = nnEngine.NN(self.scheme, iterations=1, LR=0.1, momentum=0.1,
+                          verbosity=0)
+        net.weights = deepcopy(self.weights)
+        net.loaddata(deepcopy(self.inputs), deepcopy(self.targets))
+        return net
+
+def cases(seed=0):
+    '''XOR (as in NN.XORexample) and seeded random schemes and datasets.'''
+    xor = case('XOR', [2, 3, 1], [[1, 0], [0, 1], [1, 1], [0, 0]],
+               [[1.0], [1.0], [0.0], [0.0]], seed)
+    allcases = [xor]
+    rnd = random.Random(seed)
+    for scheme in SCHEMES:
+        inputs = [[rnd.gauss(0, 1) for x in xrange(scheme[0])]
+                  for p in xrange(NPATTERNS)]
+        targets = [[float(rnd.random() < 0.5)] for p in xrange(NPATTERNS)]
+        name = '-'.join(map(str, scheme))
+        allcases.append(case(name, scheme, inputs, targets, seed))
+    return allcases
+
+### Reference (pure Python) kernels ###
+def feedforward(case):
+    '''Outputs of the network for the case inputs.'''
+    return case.net().testnet(case.inputs, 0)
+
+def backpropag(case):
+    '''Weights after one online training epoch (gradient steps).'''
+    net = case.net()
+    net.trainnet(0)
+    return net.weights
+
+def pderiv(case):
+    '''Jacobians of the output with respect to the inputs.'''
+    return case.net().pderiv([[float(x) for x in line]
+                              for line in case.inputs])
+
+def roc(case):
+    '''ROC and precision/recall curves and AUCs.'''
+    rocplot, prplot, aucROC, aucPR = nnFuncs.roc(case.real,
+                                                 case.pred).process_all()
+    return [map(list, rocplot), map(list, prplot), aucROC, aucPR]
+
+def rastercalc(case):
+    '''Output grid of the network over the raster stack.'''
+    return case.spfuncs.rastercalc(case.net().testnet, case.values, None,
+                                   case.rasters)
+
+REFERENCE = {'feedforward': feedforward, 'backpropag': backpropag,
+             'pderiv': pderiv, 'roc': roc, 'rastercalc': rastercalc}
+
+### Backend kernels ###
+def backend_feedforward(case):
+    return case.net().predict(case.inputs)
+
+def backend_rastercalc(case):
+    return case.spfuncs.rastercalc(case.net().predict, case.values, None,
+                                   case.rasters, batch=True)
+
+# Kernels computed by the backends (pderiv is not part of the backends)
+BACKEND_KERNELS = {'feedforward': backend_feedforward,
+                   'backpropag': backpropag, 'roc': roc,
+                   'rastercalc': backend_rastercalc}
+
+def plain_backpropag(case):
+    '''backpropag with the jit training kernel uncompiled.'''
+    net = case.net()
+    kernel = getattr(nnBackends.onlinetrain, 'py_func',
+                     nnBackends.onlinetrain)
+    nnBackends.flattrain(net, net.iterations, kernel)
+    return net.weights
+
+def accelerated():
+    '''Accelerated backends by name with the kernels they provide.'''
+    backends = dict([(name, BACKEND_KERNELS) for name in nnBackends.names()
+                     if name <> nnBackends.REFERENCE])
+    if nnBackends.NUMPY:
+        backends[PLAIN] = {'backpropag': plain_backpropag}
+    return backends
+
+def flatten(value):
+    '''Flat list of the numbers of nested lists/tuples.'''
+    if type(value) in (list, tuple):
+        return [x for item in value for x in flatten(item)]
+    return [value]
+
+def maxdiff(reference, result):
+    '''Maximum absolute difference of two nested structures (inf if their
+       sizes differ).'''
+    reference, result = flatten(reference), flatten(result)
+    if len(reference) <> len(result):
+        return float('inf')
+    return max([abs(x - y) for x, y in zip(reference, result)] + [0.0])
+
+def timed(func, case, repeat, backend=nnBackends.REFERENCE):
+    '''Returns the result of func(case) with a backend and its best time.'''
+    best = None
+    for i in xrange(repeat):
+        with nnBackends.using(backend):
+            start = time.time()
+            result = func(case)
+            elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+def compare(kernel, name, func, allcases, tolerance=TOLERANCE, repeat=3):
+    '''Runs the reference and an accelerated kernel on all cases, prints a
+       line per case and returns False if any result differs by more than
+       tolerance.'''
+    passed = True
+    for item in allcases:
+        reference, reftime = timed(REFERENCE[kernel], item, repeat)
+        backend = nnBackends.REFERENCE if name == PLAIN else name
+        result, acctime = timed(func, item, repeat, backend)
+        diff = maxdiff(reference, result)
+        ok = diff <= tolerance
+        passed = passed and ok
+        speedup = reftime / acctime if acctime else float('inf')
+        print ROW_MSG % (kernel, name, item.name, diff, ok and 'ok' or
+                         'FAIL', reftime, acctime, speedup)
+    return passed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checks that the ' +
+                                     'accelerated kernels match the pure ' +
+                                     'Python reference and reports the ' +
+                                     'speedups.')
+    parser.add_argument('-k', '--kernels', nargs='+', default=KERNELS,
+                        choices=KERNELS)
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    allcases = cases(args.seed)
+    backends = accelerated()
+    passed = True
+    print HEAD_MSG % ('kernel', 'backend', 'case', 'max diff', '', 'reference',
+                      'accelerated', 'speedup')
+    for kernel in args.kernels:
+        found = False
+        for name in sorted(backends):
+            if kernel in backends[name]:
+                found = True
+                passed = compare(kernel, name, backends[name][kernel],
+                                 allcases, args.tolerance,
+                                 args.repeat) and passed
+        if not found:
+            print NONE_MSG % kernel
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import math
+import os
+import random
+from os import path
+
+# Default size of the synthetic landscapes
+NCOLS    = 200
+NROWS    = 150
+NVARS    = 5
+NPOINTS  = 100
+NODATA   = -9999
+CELLSIZE = 1.0
+DATAFILE = 'data.txt'
+
+def variable(ncols, nrows, index, rnd):
+    '''Returns a smooth synthetic variable (list of rows) with a border of
+       nodata cells on the left and top edges.'''
+    fx = 2 * math.pi * (index + 1) / float(ncols)
+    fy = 2 * math.pi / float(nrows)
+    grid = []
+    for y in xrange(nrows):
+        row = []
+        for x in xrange(ncols):
+            if x < 2 or y < 2:
+                row.append(NODATA)
+            else:
+                row.append(math.sin(x * fx) + math.cos(y * fy) * index +
+                           rnd.random() * 0.1)
+        grid.append(row)
+    return grid
+
+def write_ascii(grid, filename, xllcorner=0.0, yllcorner=0.0):
+    '''Writes a grid as an ASCII raster.'''
+    output = open(filename, 'w')
+    output.write('ncols %s\nnrows %s\n' % (len(grid[0]), len(grid)))
+    output.write('xllcorner %s\nyllcorner %s\n' % (xllcorner, yllcorner))
+    output.write('cellsize %s\nNODATA_value %s\n' % (CELLSIZE, NODATA))
+    for row in grid:
+        output.write(' '.join(['%.4f' % x if x <> NODATA else str(NODATA)
+                               for x in row]) + '\n')
+    output.close()
+
+def landscape(outdir, ncols=NCOLS, nrows=NROWS, nvars=NVARS,
+              npoints=NPOINTS, absences=False, seed=0):
+    '''Writes a stack of nvars ASCII rasters (var0.txt, var1.txt, ...) in
+       'outdir/rasters' and a file with npoints presences in distinct valid
+       cells (and as many absences if absences is True) in 'outdir'.
+       Returns the rasters directory and the data file.'''
+    rnd = random.Random(seed)
+    rasterdir = path.join(outdir, 'rasters')
+    if not path.isdir(rasterdir):
+        os.makedirs(rasterdir)
+    for index in xrange(nvars):
+        grid = variable(ncols, nrows, index, rnd)
+        write_ascii(grid, path.join(rasterdir, 'var%s.txt' % index))
+        if index == 0:
+            first = grid
+
+    # Presences prefer high values of the first variable
+    cells = [(x, y) for y in xrange(2, nrows) for x in xrange(2, ncols)]
+    rnd.shuffle(cells)
+    cells.sort(key=lambda xy: -first[xy[1]][xy[0]])
+    presences = cells[:npoints]
+    points = [(1, x, y) for x, y in presences]
+    if absences:
+        points += [(0, x, y) for x, y in cells[-npoints:]]
+
+    datafile = path.join(outdir, DATAFILE)
+    output = open(datafile, 'w')
+    output.write('P;X;Y\n')
+    for p, x, y in points:
+        # Centre of the cell in map coordinates
+        output.write('%s;%s;%s\n' % (p, (x + 0.5) * CELLSIZE,
+                                     (nrows - y - 0.5) * CELLSIZE))
+    output.close()
+    return rasterdir, datafile
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Writes a synthetic ' +
+                                     'landscape (rasters and presences).')
+    parser.add_argument('outdir')
+    parser.add_argument('-c', '--ncols', type=int, default=NCOLS)
+    parser.add_argument('-r', '--nrows', type=int, default=NROWS)
+    parser.add_argument('-v', '--nvars', type=int, default=NVARS)
+    parser.add_argument('-p', '--npoints', type=int, default=NPOINTS)
+    parser.add_argument('-a', '--absences', type=int, default=0,
+                        choices=[0, 1])
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args()
+    print landscape(**args.__dict__)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from contextlib import contextmanager
+from datetime import datetime
+from os import path
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from landscape import landscape, write_ascii
+from startup import STARTUP_BUDGET, check as startupcheck
+from Neuron import nnBackends, nnFuncs, nnEngine, nnManager
+
+SCENARIOS = ['startup', 'read_rasters', 'ExtractValues', 'pseudo_absences',
+             'trainnet', 'pderiv', 'profiler', 'rastercalc', 'modelstats',
+             'roc']
+
+# Relative slowdown against the baseline reported as a regression
+TOLERANCE      = 0.2
+
+RESULT_MSG     = "%-16s best %9.4f s  mean %9.4f s"
+COMPARE_MSG    = "%-16s %9.4f s  baseline %9.4f s  ratio %5.2f %s"
+
+@contextmanager
+def quiet():
+    '''Hides the messages printed by Simapse (no connection).'''
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+class suite():
+    '''Timed scenarios on a synthetic landscape written in workdir.'''
+    def __init__(self, workdir, ncols, nrows, nvars, npoints, hidden=3,
+                 iterations=10, models=3, rocpoints=5000, seed=0):
+        self.workdir = workdir
+        self.npoints = npoints
+        self.iterations = iterations
+        self.seed = seed
+        self.rasterdir, self.datafile = landscape(workdir, ncols, nrows,
+                                                  nvars, npoints, seed=seed)
+        random.seed(seed)
+        with quiet():
+            self.manager = nnManager.Manager(None)
+            read = self.manager.read_rasters(self.rasterdir, True)
+            self.rasters, self.values, self.stats, self.header = read
+            self.spfuncs = nnFuncs.spatial_functions(*self.header)
+            self.spfuncs.create_nodata_list(self.values[self.rasters[0]])
+            self.data, self.variables, self.coordinates = \
+                self.spfuncs.ExtractValues(self.datafile, self.values,
+                                           self.rasters, 1, workdir)
+        self.presences = self.coordinates[:npoints]
+        self.net = nnEngine.NN([nvars, hidden, 1], iterations=iterations,
+                               verbosity=0)
+        self.net.loaddata(self.variables, self.data)
+        self.varprof = nnFuncs.profiler(self.stats, self.rasters)
+
+        self.models = []
+        for i in xrange(models):
+            self.net.rndWeights()
+            model = path.join(workdir, 'Model_%s.txt' % i)
+            grid = self.spfuncs.rastercalc(self.net.testnet, self.values,
+                                           None, self.rasters)
+            self.spfuncs.write_ascii(grid, model)
+            self.models.append(model)
+        random.seed(seed)
+        self.net.rndWeights()
+
+        rnd = random.Random(seed)
+        self.real = [rnd.randint(0, 1) for i in xrange(rocpoints)]
+        self.pred = [rnd.random() for i in xrange(rocpoints)]
+
+    def startup(self):
+        subprocess.check_call([sys.executable, '-c', 'import Neuron'],
+                              cwd=ROOT)
+
+    def read_rasters(self):
+        self.manager.read_rasters(self.rasterdir, True)
+
+    def ExtractValues(self):
+        self.spfuncs.ExtractValues(self.coordinates, self.values,
+                                   self.rasters)
+
+    def pseudo_absences(self):
+        random.seed(self.seed)
+        self.spfuncs.pseudo_absences(self.presences, self.npoints)
+
+    def trainnet(self):
+        random.seed(self.seed)
+        self.net.rndWeights()
+        self.net.loaddata(self.variables, self.data)
+        self.net.trainnet(0)
+
+    def pderiv(self):
+        for line in self.variables:
+            self.net.pderiv(line)
+
+    def profiler(self):
+        for raster in self.rasters:
+            self.varprof.varsurface(raster, self.net.predict)
+            self.varprof.onewayprofile(raster, self.net.predict)
+
+    def rastercalc(self):
+        self.spfuncs.rastercalc(self.net.predict, self.values, None,
+                                self.rasters, batch=True)
+
+    def modelstats(self):
+        self.spfuncs.modelstats(self.models, self.workdir)
+
+    def roc(self):
+        nnFuncs.roc(self.real, self.pred).process_all()
+
+    def run(self, scenario, repeat=3):
+        '''Times a scenario repeat times and returns the best and the mean
+           wall times (seconds).'''
+        func = getattr(self, scenario)
+        times = []
+        for i in xrange(repeat):
+            with quiet():
+                start = time.time()
+                func()
+                times.append(time.time() - start)
+        return {'best': min(times), 'mean': sum(times) / len(times),
+                'repeat': repeat}
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''Prints the ratio of the best times to a baseline and returns the
+       scenarios slower than the baseline by more than tolerance.'''
+    regressions = []
+    for scenario in SCENARIOS:
+        if scenario not in results or scenario not in baseline:
+            continue
+        best, base = results[scenario]['best'], baseline[scenario]['best']
+        ratio = best / base if base else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = 'REGRESSION'
+            regressions.append(scenario)
+        print COMPARE_MSG % (scenario, best, base, ratio, flag)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simapse benchmarks on ' +
+                                     'synthetic landscapes.')
+    parser.add_argument('-c', '--ncols', type=int, default=200)
+    parser.add_argument('-r', '--nrows', type=int, default=150)
+    parser.add_argument('-v', '--nvars', type=int, default=5)
+    parser.add_argument('-p', '--npoints', type=int, default=100)
+    parser.add_argument('-hl', '--hidden', type=int, default=3)
+    parser.add_argument('-i', '--iterations', type=int, default=10)
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-sc', '--scenarios', nargs='+', default=SCENARIOS,
+                        choices=SCENARIOS)
+    parser.add_argument('-be', '--backend', default=nnBackends.REFERENCE,
+                        choices=[nnBackends.AUTO] + nnBackends.names())
+    parser.add_argument('-o', '--output', help='JSON file for the results')
+    parser.add_argument('-b', '--baseline', help='JSON file of a previous ' +
+                        'run to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = {'ncols': args.ncols, 'nrows': args.nrows, 'nvars': args.nvars,
+             'npoints': args.npoints, 'hidden': args.hidden,
+             'iterations': args.iterations}
+    backend = nnBackends.select(args.backend,
+                                [args.nvars, args.hidden, 1]).name
+    workdir = tempfile.mkdtemp(prefix='simapse_bench_')
+    try:
+        bench = suite(workdir, args.ncols, args.nrows, args.nvars,
+                      args.npoints, args.hidden, args.iterations,
+                      seed=args.seed)
+        results = {}
+        for scenario in [x for x in SCENARIOS if x in args.scenarios]:
+            results[scenario] = bench.run(scenario, args.repeat)
+            print RESULT_MSG % (scenario, results[scenario]['best'],
+                                results[scenario]['mean'])
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {'date': datetime.now().isoformat(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'numpy': nnBackends.NUMPY, 'backend': backend,
+              'seed': args.seed, 'sizes': sizes,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=1, sort_keys=True)
+
+    failed = False
+    if 'startup' in results:
+        failed = not startupcheck(STARTUP_BUDGET, args.repeat)
+    if args.baseline:
+        baseline = json.load(open(args.baseline))
+        if baseline.get('backend') <> backend:
+            print 'Warning: the baseline was run with the %s backend' % \
+                  baseline.get('backend')
+        if baseline['sizes'] <> sizes:
+            print 'Warning: the baseline was run with sizes %s' % \
+                  baseline['sizes']
+        if compare(results, baseline['results'], args.tolerance):
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
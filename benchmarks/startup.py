@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''
+SIMAPSE - simulation maps for ecological niche modelling
+Version 1.01 beta
+Copyright (C) 2010  Pedro Tarroso
+
+Please cite: 
+"Tarroso, P., Carvalho, S. & Brito, J.C. (2012) Simapse - Simulation
+Maps for Ecological Niche Modelling. Methods in Ecology and Evolution
+doi: 10.1111/j.2041-210X.2012.00210.x"
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from os import path
+import argparse
+import subprocess
+import sys
+import time
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Maximum time (seconds) to start python and import Neuron
+STARTUP_BUDGET = 0.5
+# Modules that import Neuron must not load (they are imported when used)
+DEFERRED = ['numpy', 'numba', 'matplotlib', 'Tkinter', 'Neuron.nnGraphs',
+            'Neuron.MainGUI']
+
+# Run in a new python: imports Neuron and prints the modules loaded
+CHILD = ('import sys; import Neuron; ' +
+         'print " ".join([x for x in sys.modules if sys.modules[x]])')
+
+BUDGET_MSG = "startup took %.3f s (budget %.3f s) %s"
+LOADED_MSG = "import Neuron loaded %s"
+
+def startup(repeat=3):
+    '''Starts python and imports Neuron in a subprocess repeat times.
+       Returns the best time and the names of the modules loaded.'''
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', CHILD],
+                                         cwd=ROOT)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, output.split()
+
+def check(budget=STARTUP_BUDGET, repeat=3):
+    '''Prints the startup time and the deferred modules loaded by import
+       Neuron. Returns False if the time is over budget or any deferred
+       module was loaded.'''
+    best, modules = startup(repeat)
+    loaded = [x for x in DEFERRED if x in modules]
+    ok = best <= budget
+    print BUDGET_MSG % (best, budget, ok and 'ok' or 'FAIL')
+    if loaded:
+        print LOADED_MSG % ', '.join(loaded)
+    return ok and not loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checks that importing ' +
+                                     'Neuron stays within the startup ' +
+                                     'budget and does not load numpy, ' +
+                                     'numba, matplotlib or the GUI.')
+    parser.add_argument('-t', '--budget', type=float, default=STARTUP_BUDGET)
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    return 0 if check(args.budget, args.repeat) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,5 +25,6 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 if __name__ == '__main__':
     import Neuron
+    Neuron.main()
 
 